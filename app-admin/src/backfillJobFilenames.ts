@@ -0,0 +1,37 @@
+import type { Payload } from 'payload';
+
+type JobFile = {
+  id?: string;
+  file: string | { id: string; filename?: string };
+  filename?: string | null;
+};
+
+// Jobs created before the filename was stored on the job only reference their media docs, and the jobs
+// listing no longer populates those. Copies each media filename onto such jobs; a no-op once all have one.
+export const backfillJobFilenames = async (payload: Payload): Promise<void> => {
+  try {
+    const { docs } = await payload.find({
+      collection: 'jobs',
+      where: { 'files.filename': { exists: false } },
+      depth: 1,
+      pagination: false,
+    });
+    let updated = 0;
+    for (const job of docs) {
+      const files = ((job.files ?? []) as JobFile[]).map((entry) => {
+        const media = typeof entry.file === 'object' ? entry.file : null;
+        return {
+          id: entry.id,
+          file: media?.id ?? entry.file,
+          filename: entry.filename ?? media?.filename ?? null,
+        };
+      });
+      if (!files.some((entry) => entry.filename)) continue; // Media deleted; the frontend shows a placeholder
+      await payload.update({ collection: 'jobs', id: job.id, data: { files }, depth: 0 });
+      updated += 1;
+    }
+    if (updated > 0) payload.logger.info(`Backfilled file names on ${updated} jobs`);
+  } catch (error) {
+    payload.logger.error(`Backfilling job file names failed: ${error}`);
+  }
+};
@@ -5,6 +5,24 @@ const Jobs: CollectionConfig = {
   admin: {
     useAsTitle: 'id',
   },
+  hooks: {
+    afterRead: [
+      // List requests can leave out large fields, e.g. ?omit=resultData when polling the jobs page.
+      // hasResults is reported in place of resultData so the list can still tell which jobs have summaries.
+      ({ doc, req, findMany }) => {
+        const omit = typeof req?.query?.omit === 'string' ? req.query.omit.split(',') : [];
+        if (!findMany || omit.length === 0) return doc;
+        const projected = { ...doc };
+        if (omit.includes('resultData')) {
+          projected.hasResults = Object.keys(doc.resultData?.Result ?? {}).length > 0;
+        }
+        omit.forEach((field) => {
+          delete projected[field];
+        });
+        return projected;
+      },
+    ],
+  },
   access: {
     create: ({ req: { user } }) => {
       return !!user; // Allow authenticated users to create jobs
@@ -34,6 +52,11 @@ const Jobs: CollectionConfig = {
           relationTo: 'media',
           required: true,
         },
+        {
+          name: 'filename',
+          type: 'text',
+          required: false,
+        },
       ],
       required: true,
     },
@@ -48,6 +71,14 @@ const Jobs: CollectionConfig = {
       defaultValue: 'started',
       required: true,
     },
+    {
+      name: 'progress',
+      type: 'json',
+      required: false,
+      admin: {
+        readOnly: true,
+      },
+    },
     {
       name: 'resultData',
       type: 'json',
@@ -1,6 +1,8 @@
 import express from 'express'
 import payload from 'payload'
 
+import { backfillJobFilenames } from './backfillJobFilenames'
+
 const app = express()
 
 // Redirect root to Admin panel
@@ -15,6 +17,8 @@ const start = async () => {
     express: app,
     onInit: async () => {
       payload.logger.info(`Payload Admin URL: ${payload.getAdminURL()}`)
+      // Not awaited, so the server starts listening while older jobs are updated
+      void backfillJobFilenames(payload)
     },
   })
 
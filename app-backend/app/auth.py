@@ -1,7 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, Response, Request
-import requests, os
+import httpx, os, hashlib
 from pydantic import BaseModel, EmailStr
 
+from . import cms
+from .ttl_cache import AsyncTTLCache
+
 class LoginForm(BaseModel):
     email: EmailStr
     password: str
@@ -13,23 +16,38 @@ class SignupForm(BaseModel):
 
 router = APIRouter()
 
-def get_current_user(request: Request):
+# Validated CMS profiles keyed by token hash, so raw tokens are never held as cache keys
+user_cache = AsyncTTLCache(
+    maxsize=int(os.getenv('AUTH_CACHE_MAXSIZE', '4096')),
+    ttl=float(os.getenv('AUTH_CACHE_TTL', '60')),
+)
+
+def token_key(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+async def fetch_current_user(token: str) -> dict:
+    try:
+        response = await cms.get_me(token)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if response.status_code != 200:
+        raise HTTPException(status_code=401, detail="Not Authenticated, No CMS Profile")
+    user = response.json()
+    # Payload answers users/me with {"user": null} for expired tokens
+    if not user.get("user"):
+        raise HTTPException(status_code=401, detail="Not Authenticated, No CMS Profile")
+    return user
+
+async def get_current_user(request: Request):
     token = request.cookies.get("payload-token")
     if not token:
         raise HTTPException(status_code=401, detail="Not Authenticated, No CMS Token")
-    response = requests.get("http://app-admin:3000/cms/api/users/me", headers={"Authorization": f"Bearer {token}"})
-    if response.status_code != 200:
-        raise HTTPException(status_code=401, detail="Not Authenticated, No CMS Profile")
-    return response.json()
+    return await user_cache.get_or_load(token_key(token), lambda: fetch_current_user(token))
 
 @router.post("/login")
 async def login(response: Response, form_data: LoginForm):
     try:
-        res = requests.post(
-            "http://app-admin:3000/cms/api/users/login",
-            json=form_data.model_dump(),
-            headers={"Content-Type": "application/json"},
-        )
+        res = await cms.login(form_data.model_dump())
 
         payload_data = res.json()
         if res.status_code != 200:
@@ -40,17 +58,13 @@ async def login(response: Response, form_data: LoginForm):
         if token:
             response.set_cookie(key="payload-token", value=token)
         return payload_data
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/signup")
 async def signup(response: Response, form_data: SignupForm):
     try:
-        res = requests.post(
-            "http://app-admin:3000/cms/api/users",
-            json=form_data.model_dump(),
-            headers={"Content-Type": "application/json"},
-        )
+        res = await cms.signup(form_data.model_dump())
 
         payload_data = res.json()
         if res.status_code != 200:
@@ -61,22 +75,19 @@ async def signup(response: Response, form_data: SignupForm):
         if token:
             response.set_cookie(key="payload-token", value=token)
         return payload_data
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/logout", dependencies=[Depends(get_current_user)])
 async def logout(request: Request, response: Response):
+    user_cache.invalidate(token_key(request.cookies.get("payload-token")))
     try:
-        res = requests.post(
-            "http://app-admin:3000/cms/api/users/logout",
-            headers={"Content-Type": "application/json"},
-            cookies=request.cookies
-        )
+        res = await cms.logout(request.cookies)
 
         if res.status_code != 200:
             raise HTTPException(status_code=res.status_code, detail=res.json())
         
         response.delete_cookie("payload-token")
         return {"message": "Logged out successfully"}
-    except requests.RequestException as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,117 @@
+from contextlib import contextmanager
+from fastapi import UploadFile
+from typing import BinaryIO
+import asyncio, hashlib, json, mmap, os, tempfile, threading, time
+
+# Directory shared between the API and Celery containers (see docker-compose volumes)
+BLOB_STORE_DIR = os.getenv('BLOB_STORE_DIR', '/data/blobs')
+BLOB_CHUNK_SIZE = int(os.getenv('BLOB_CHUNK_SIZE', str(1024 * 1024)))
+# Blobs older than this are removed opportunistically; the original file is kept in Payload media
+BLOB_TTL_SECONDS = float(os.getenv('BLOB_TTL_HOURS', '24')) * 3600
+PRUNE_INTERVAL_SECONDS = 600
+
+_last_prune = 0.0
+_prune_lock = threading.Lock()
+
+def blob_path(sha256: str) -> str:
+    return os.path.join(BLOB_STORE_DIR, sha256[:2], sha256)
+
+async def store_upload(file: UploadFile, mime_type: str) -> dict:
+    """
+    Stream an upload to the content-addressed store in fixed-size chunks and return its reference.
+    The file I/O runs in a thread, so large uploads do not block the event loop.
+    """
+    sha256, size = await asyncio.to_thread(store_stream, file.file)
+    return {"filename": file.filename, "sha256": sha256, "size": size, "mime_type": mime_type}
+
+def store_stream(stream: BinaryIO) -> tuple:
+    """
+    Copy a file object into the store in fixed-size chunks, returning its sha256 and size.
+    """
+    os.makedirs(BLOB_STORE_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=BLOB_STORE_DIR, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            while chunk := stream.read(BLOB_CHUNK_SIZE):
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+        sha256 = digest.hexdigest()
+        path = blob_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Identical uploads collapse to one file; os.replace is atomic on the same filesystem
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return sha256, size
+
+def store_bytes(data: bytes) -> str:
+    """
+    Store an in-memory blob, such as an intermediate pipeline result, and return its sha256.
+    """
+    sha256 = hashlib.sha256(data).hexdigest()
+    path = blob_path(sha256)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    else:
+        # Refresh the mtime so a blob that is still referenced is not pruned
+        os.utime(path)
+    prune_expired()
+    return sha256
+
+def read_bytes(sha256: str) -> bytes:
+    with open(blob_path(sha256), 'rb') as f:
+        return f.read()
+
+def store_json(value) -> str:
+    return store_bytes(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+
+def read_json(sha256: str):
+    return json.loads(read_bytes(sha256))
+
+@contextmanager
+def open_blob(sha256: str):
+    """
+    Memory-map a stored blob read-only, so readers page it in lazily instead of copying it.
+    """
+    with open(blob_path(sha256), 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+def prune_expired():
+    """
+    Remove expired blobs, at most once per interval. Walks the whole store, so the API runs it as a
+    background task after the response rather than on the event loop.
+    """
+    global _last_prune
+    now = time.time()
+    if now - _last_prune < PRUNE_INTERVAL_SECONDS or not _prune_lock.acquire(blocking=False):
+        return
+    try:
+        _last_prune = now
+        for root, _, filenames in os.walk(BLOB_STORE_DIR):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                try:
+                    if now - os.stat(path).st_mtime > BLOB_TTL_SECONDS:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+    finally:
+        _prune_lock.release()
@@ -1,69 +1,172 @@
-from celery import Celery
-import os, base64, requests, uuid
-from pdf2image import convert_from_bytes
-from io import BytesIO
-
-from .extract import extract_from_iep
-from fastembed.embedding import DefaultEmbedding
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams, PointStruct
-
-CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://redis:6379/0')
-CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://redis:6379/0')
-
-celery_app = Celery('app', broker=CELERY_BROKER_URL, backend=CELERY_RESULT_BACKEND)
-
-celery_app.conf.update(
-    task_serializer='json',
-    accept_content=['json'],
-    result_serializer='json',
-    timezone='UTC',
-    enable_utc=True,
+from celery import Task, chain
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
+from qdrant_client.http.exceptions import ResponseHandlingException
+import asyncio, httpx, os
+
+from .extract import IEPExtractor, RETRYABLE_ERRORS
+from .chunking import chunk_sections
+from . import blobstore, cms, metrics, resources, tracing
+from .ratelimit import get_token_budget
+from .rasterize import iter_document_pages, count_document_pages
+from .pagefilter import PageFilter
+from .progress import JobProgress
+from .vectorstore import embed_chunks, upsert_points
+from .tasks import (
+    celery_app, PROCESS_JOB, RASTERIZE_DOCUMENT, CLASSIFY_PAGES, STRUCTURE_SECTIONS, EMBED_CHUNKS, INDEX_POINTS, FINALIZE_JOB,
+)
+
+STAGE_MAX_RETRIES = int(os.getenv('CELERY_STAGE_MAX_RETRIES', '5'))
+
+# Errors worth retrying a stage for; everything else fails the job straight away.
+# Stages must not mutate their job argument, since a retry re-sends the same arguments
+TRANSIENT_ERRORS = RETRYABLE_ERRORS + (
+    httpx.TransportError, ResponseHandlingException, cms.CMSUnavailable, ConnectionError, TimeoutError,
 )
 
-@celery_app.task(name="process_job")
-def process_job(file_data: dict, job_id: str, token: str):
-    base64_images = []
-    for file_bytes in file_data:
-        filename = file_bytes['filename']
-        content = base64.b64decode(file_bytes['content'].encode('utf-8'))
-        
-        if filename.endswith('.pdf'):
-            images = convert_from_bytes(content)
-            for image in images:
-                buffered = BytesIO()
-                image.save(buffered, format="PNG")
-                buffered.seek(0)
-                # Convert bytes to base64
-                base64_image = base64.b64encode(buffered.read()).decode('utf-8')
-                base64_images.append(base64_image)
-        
-        elif filename.endswith(('.jpg', '.jpeg', '.png')):
-            base64_images.append(base64.b64encode(content).decode('utf-8'))
-            
-    results_dict, chunks_dict = extract_from_iep(base64_images)
-
-    # Initialize Qdrant Collection
-    collection_name=f'job_{job_id}'
-    fastembed_model = DefaultEmbedding()
-    fast_embeddings = fastembed_model.embed(chunks_dict.values())
-    qdrant_client = QdrantClient(url='http://qdrant:6333')
-    vector_param = VectorParams(size=384, distance=Distance.DOT)
-    qdrant_client.create_collection(collection_name=collection_name, vectors_config=vector_param)
-    # Prepare points with IDs
-    points = [
-        PointStruct(id=str(uuid.uuid4()), vector=vector, payload={"original_id": chunk_id, "text": chunk})
-        for vector, (chunk_id, chunk) in zip(fast_embeddings, chunks_dict.items())
-    ]
-    # Insert points into the collection using the upsert method
-    qdrant_client.upsert(collection_name=collection_name, points=points)
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    metrics.start_worker_metrics_server()
+
+@worker_process_init.connect
+def init_worker_resources(**kwargs):
+    # Each prefork child gets its own model and client, loaded before the first task arrives
+    resources.reset()
+    resources.warm_up()
+
+@worker_process_shutdown.connect
+def release_worker_metrics(pid=None, **kwargs):
+    metrics.mark_worker_process_dead(pid or os.getpid())
+
+class PipelineTask(Task):
+    """
+    A pipeline stage. Stages are acknowledged only once they finish, so a lost worker re-runs just that stage,
+    and are retried on their own for transient errors. Every stage takes the job dict produced by the previous one.
+    Each run is timed under the task's `stage` label and traced as part of the job's trace.
+    """
+    stage = None
+    acks_late = True
+    reject_on_worker_lost = True
+    autoretry_for = TRANSIENT_ERRORS
+    max_retries = STAGE_MAX_RETRIES
+    retry_backoff = True
+    retry_backoff_max = 300
+    retry_jitter = True
+
+    def __call__(self, *args, **kwargs):
+        job = args[0] if args else kwargs['job']
+        with tracing.job_span(f"pipeline.{self.stage}", job["job_id"], job.get("trace_context")), \
+                metrics.PIPELINE_STAGE_SECONDS.labels(self.stage).time():
+            return super().__call__(*args, **kwargs)
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        # Called once retries are exhausted; the rest of the chain is not run
+        metrics.PIPELINE_STAGE_FAILURES.labels(self.stage).inc()
+        job = args[0] if args else kwargs.get('job')
+        if job:
+            release_job(job)
+            restore_progress(job).fail(exc)
+
+def restore_progress(job: dict) -> JobProgress:
+    return JobProgress.restore(job["job_id"], job["token"], job.get("progress"))
+
+def release_job(job: dict):
+    get_token_budget().release_user_pages(job["user_id"], job.get("pages_reserved", 0))
+
+def load_pages(page_refs: list):
+    for page_ref in page_refs:
+        yield {**page_ref, "content": blobstore.read_bytes(page_ref["blob"]).decode('utf-8')}
+
+@celery_app.task(name=PROCESS_JOB)
+def process_job(file_refs: list, job_id: str, token: str, user_id: str = None, trace_context: dict = None):
+    job = {
+        "job_id": job_id, "token": token, "user_id": user_id, "file_refs": file_refs,
+        "pages_reserved": 0, "progress": {}, "stats": {}, "trace_context": trace_context,
+    }
+    try:
+        # An unreadable or encrypted PDF fails here, before any stage exists to report it
+        pages_total = count_document_pages(file_refs)
+        # Every stage of a job runs in the same priority lane, chosen by how many pages its user already has in flight
+        priority = get_token_budget().reserve_user_pages(user_id, pages_total)
+        job.update(pages_reserved=pages_total, progress={"pages_total": pages_total})
+        stages = [rasterize_document.s(job), classify_pages.s(), structure_sections.s(), embed_job_chunks.s(), index_points.s(), finalize_job.s()]
+        with tracing.job_span("pipeline.dispatch", job_id, trace_context):
+            chain(*(stage.set(priority=priority) for stage in stages)).apply_async()
+    except Exception as e:
+        # No stage will run, so fail the job as a stage's on_failure would
+        release_job(job)
+        restore_progress(job).fail(e)
+        raise
+
+@celery_app.task(name=RASTERIZE_DOCUMENT, base=PipelineTask, stage="rasterize")
+def rasterize_document(job: dict):
+    progress = restore_progress(job)
+    progress.set_stage("rasterizing")
+    # Blank and duplicate pages are dropped; the rest are handed on as blob references rather than inline images
+    page_filter = PageFilter()
+    page_refs = []
+    for page in progress.track_rasterized(iter_document_pages(job["file_refs"], page_filter=page_filter), page_filter):
+        content = page.pop("content")
+        page_refs.append({**page, "blob": blobstore.store_bytes(content.encode('utf-8'))})
+    stats = {**job["stats"], "skipped_pages": page_filter.skipped}
+    return {**job, "page_refs": page_refs, "stats": stats, "progress": progress.state}
+
+@celery_app.task(name=CLASSIFY_PAGES, base=PipelineTask, stage="classify")
+def classify_pages(job: dict):
+    progress = restore_progress(job)
+    progress.set_stage("extracting")
+
+    async def run():
+        extractor = IEPExtractor(progress=progress, stats=job["stats"], user_id=job["user_id"])
+        try:
+            section_text_dict = await extractor.classify_pages(load_pages(job["page_refs"]))
+        finally:
+            await extractor.close()
+        return section_text_dict, extractor.section_page_spans, extractor.stats
+
+    # Model responses are cached, so a retried stage does not pay for pages it already classified
+    section_text_dict, section_page_spans, stats = asyncio.run(run())
+    job = {key: value for key, value in job.items() if key != "page_refs"}
+    return {
+        **job,
+        "section_texts": blobstore.store_json(section_text_dict),
+        "page_spans": blobstore.store_json(section_page_spans),
+        "stats": stats,
+        "progress": progress.state,
+    }
+
+@celery_app.task(name=STRUCTURE_SECTIONS, base=PipelineTask, stage="structure")
+def structure_sections(job: dict):
+    progress = restore_progress(job)
+    section_text_dict = blobstore.read_json(job["section_texts"])
+
+    async def run():
+        extractor = IEPExtractor(progress=progress, stats=job["stats"], user_id=job["user_id"])
+        try:
+            section_info_dict = await extractor.structure_sections(section_text_dict)
+        finally:
+            await extractor.close()
+        return section_info_dict, extractor.finish_stats()
+
+    section_info_dict, stats = asyncio.run(run())
+    return {**job, "results": blobstore.store_json(section_info_dict), "stats": stats, "progress": progress.state}
+
+@celery_app.task(name=EMBED_CHUNKS, base=PipelineTask, stage="embed")
+def embed_job_chunks(job: dict):
+    progress = restore_progress(job)
+    progress.set_stage("indexing")
+    chunks = chunk_sections(blobstore.read_json(job["section_texts"]), blobstore.read_json(job["page_spans"]))
+    points = list(embed_chunks(job["job_id"], job["user_id"], chunks))
+    return {**job, "points": blobstore.store_json(points), "progress": progress.state}
+
+@celery_app.task(name=INDEX_POINTS, base=PipelineTask, stage="upsert")
+def index_points(job: dict):
+    # Upserts are keyed by deterministic point ids, so a retry overwrites rather than duplicates
+    upsert_points(job["job_id"], blobstore.read_json(job["points"]))
+    return {key: value for key, value in job.items() if key != "points"}
 
+@celery_app.task(name=FINALIZE_JOB, base=PipelineTask, stage="finalize")
+def finalize_job(job: dict):
+    progress = restore_progress(job)
     # Update the job status with the result
-    response = requests.patch(
-        f"http://app-admin:3000/cms/api/jobs/{job_id}",
-        headers={"Authorization": f"Bearer {token}"},
-        json={"status": "completed", "resultData": {'Result': results_dict}},
-    )
-    
-    if response.status_code != 200:
-        raise Exception("Failed to update job status")
\ No newline at end of file
+    progress.complete(blobstore.read_json(job["results"]), job["stats"])
+    release_job(job)
@@ -0,0 +1,234 @@
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import logging, os, re, threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# The embedding model (bge-small) truncates at 512 tokens including [CLS] and [SEP], so windows stay well inside it
+EMBEDDING_MAX_TOKENS = 512
+CHUNK_MAX_TOKENS = min(int(os.getenv('CHUNK_MAX_TOKENS', '256')), EMBEDDING_MAX_TOKENS - 2)
+# Tokens of trailing context repeated at the start of the next chunk, rounded to whole sentences
+CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', '40'))
+# 'model' counts with the embedding model's tokenizer; 'approx' uses a word/punctuation estimate
+CHUNK_TOKENIZER = os.getenv('CHUNK_TOKENIZER', 'model')
+
+WHITESPACE = re.compile(r'\s+')
+WHITESPACE_CODES = np.array([ord(c) for c in ' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f\x85\xa0\u2000\u2009\u200a\u2028\u2029\u202f\u3000'], dtype=np.uint32)
+# WordPiece splits uncommon words, so word/punctuation counts run about a fifth low
+APPROX_SUBWORD_STRIDE = 5
+
+# Maps a section's text to the character offset at which each of its tokens starts
+TokenOffsets = Callable[[str], np.ndarray]
+
+def normalize_spaces(text: str) -> str:
+    return WHITESPACE.sub(' ', text).strip()
+
+def code_points(text: str) -> np.ndarray:
+    # One element per character, so array indices are character offsets into `text`
+    return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+
+def character_classes(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Whitespace and word-character (\\w) masks. Non-ASCII characters that are not spaces count as word characters.
+    """
+    space = np.isin(codes, WHITESPACE_CODES)
+    word = (
+        ((codes >= ord('0')) & (codes <= ord('9'))) | ((codes >= ord('A')) & (codes <= ord('Z')))
+        | ((codes >= ord('a')) & (codes <= ord('z'))) | (codes == ord('_')) | ((codes > 127) & ~space)
+    )
+    return space, word
+
+def run_starts(mask: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(mask & ~np.concatenate(([False], mask[:-1])))
+
+def run_ends(mask: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(mask & ~np.concatenate((mask[1:], [False]))) + 1
+
+def approx_token_offsets(text: str) -> np.ndarray:
+    """
+    Starts of words and punctuation marks, with every fifth word counted twice to allow for WordPiece subwords.
+    """
+    space, word = character_classes(code_points(text))
+    starts = np.union1d(run_starts(word), np.flatnonzero(~space & ~word))
+    return np.sort(np.concatenate((starts, starts[::APPROX_SUBWORD_STRIDE])), kind='stable')
+
+def model_token_offsets() -> TokenOffsets:
+    """
+    Tokenize a whole section at once with the embedding model's own tokenizer.
+    """
+    from . import resources
+    from tokenizers import Tokenizer
+    # fastembed pads and truncates its tokenizer for inference; counting needs every token
+    tokenizer = Tokenizer.from_str(resources.get_embedding_model().model.tokenizer.to_str())
+    tokenizer.no_padding()
+    tokenizer.no_truncation()
+
+    def offsets(text: str) -> np.ndarray:
+        encoding = tokenizer.encode(text, add_special_tokens=False)
+        return np.array(encoding.offsets, dtype=np.int64).reshape(-1, 2)[:, 0]
+    return offsets
+
+_token_offsets: Optional[TokenOffsets] = None
+_token_offsets_lock = threading.Lock()
+
+def get_token_offsets() -> TokenOffsets:
+    global _token_offsets
+    if _token_offsets is None:
+        with _token_offsets_lock:
+            if _token_offsets is None:
+                if CHUNK_TOKENIZER == 'model':
+                    try:
+                        _token_offsets = model_token_offsets()
+                    except Exception:
+                        logger.warning("Embedding tokenizer unavailable, estimating token counts", exc_info=True)
+                        _token_offsets = approx_token_offsets
+                else:
+                    _token_offsets = approx_token_offsets
+    return _token_offsets
+
+def span_token_counts(token_starts: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    # Tokens starting inside each [start, end) character range, for all ranges at once
+    return np.searchsorted(token_starts, ends, side='left') - np.searchsorted(token_starts, starts, side='left')
+
+def sentence_spans(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Start and end character offsets of each sentence in `text`, with surrounding whitespace excluded.
+
+    Sentences end at whitespace after "." or "?", except after initialisms ("e.g.") and titles ("Dr."),
+    the same rule as the regex (?<!\\w\\.\\w.)(?<![A-Z][a-z]\\.)(?<=\\.|\\?)\\s, evaluated on whole arrays.
+    """
+    codes = code_points(text)
+    space, word = character_classes(codes)
+    if not (~space).any():
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    def shifted(mask: np.ndarray, by: int) -> np.ndarray:
+        # mask[i - by] at position i, False before the start of the text
+        return np.concatenate((np.zeros(by, dtype=bool), mask[:-by])) if by < len(mask) else np.zeros(len(mask), dtype=bool)
+
+    period = codes == ord('.')
+    upper = (codes >= ord('A')) & (codes <= ord('Z'))
+    lower = (codes >= ord('a')) & (codes <= ord('z'))
+    initialism = shifted(word, 4) & shifted(period, 3) & shifted(word, 2)
+    title = shifted(upper, 3) & shifted(lower, 2) & shifted(period, 1)
+    boundaries = np.flatnonzero(space & (shifted(period, 1) | shifted(codes == ord('?'), 1)) & ~initialism & ~title)
+
+    starts = np.concatenate(([0], boundaries + 1))
+    ends = np.concatenate((boundaries, [len(text)]))
+    # Trim to the first and last non-space character of each segment
+    non_space_starts, non_space_ends = run_starts(~space), run_ends(~space)
+    first = np.searchsorted(non_space_starts, starts, side='left')
+    last = np.searchsorted(non_space_ends, ends, side='right') - 1
+    keep = (first <= last) & (first < len(non_space_starts))
+    trimmed_starts = np.maximum(non_space_starts[np.minimum(first, len(non_space_starts) - 1)], starts)
+    trimmed_ends = np.minimum(non_space_ends[np.maximum(last, 0)], ends)
+    return trimmed_starts[keep], trimmed_ends[keep]
+
+def split_long_spans(text: str, starts: np.ndarray, ends: np.ndarray, lengths: np.ndarray, max_tokens: int,
+                     token_starts: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Break sentences longer than a whole window (tables, run-on OCR text) at word boundaries.
+    """
+    long = np.nonzero(lengths > max_tokens)[0]
+    if len(long) == 0:
+        return starts, ends, lengths
+    pieces = []
+    for index in long:
+        space, _ = character_classes(code_points(text[starts[index]:ends[index]]))
+        words = np.column_stack((run_starts(~space), run_ends(~space))) + starts[index]
+        word_lengths = span_token_counts(token_starts, words[:, 0], words[:, 1])
+        piece_start, piece_length = 0, 0
+        for word, word_length in enumerate(word_lengths):
+            if piece_length and piece_length + word_length > max_tokens:
+                pieces.append((index, words[piece_start, 0], words[word - 1, 1]))
+                piece_start, piece_length = word, 0
+            piece_length += word_length
+        pieces.append((index, words[piece_start, 0], words[-1, 1]))
+    # Replace each long sentence by its pieces, keeping document order
+    keep = np.ones(len(starts), dtype=bool)
+    keep[long] = False
+    order = np.concatenate((np.nonzero(keep)[0], np.array([index for index, _, _ in pieces])))
+    starts = np.concatenate((starts[keep], np.array([start for _, start, _ in pieces], dtype=np.int64)))
+    ends = np.concatenate((ends[keep], np.array([end for _, _, end in pieces], dtype=np.int64)))
+    order = np.lexsort((starts, order))
+    starts, ends = starts[order], ends[order]
+    return starts, ends, span_token_counts(token_starts, starts, ends)
+
+def window_bounds(lengths: np.ndarray, max_tokens: int, overlap_tokens: int) -> List[Tuple[int, int]]:
+    """
+    Greedy sentence windows [i, j) of at most `max_tokens`, each starting with the last sentences of the
+    previous window that fit in `overlap_tokens`. Found by binary search over the cumulative token counts.
+    """
+    if len(lengths) == 0:
+        return []
+    cumulative = np.concatenate(([0], np.cumsum(lengths)))
+    bounds = []
+    start = 0
+    while True:
+        end = int(np.searchsorted(cumulative, cumulative[start] + max_tokens, side='right')) - 1
+        end = max(end, start + 1)
+        bounds.append((start, end))
+        if end >= len(lengths):
+            return bounds
+        next_start = int(np.searchsorted(cumulative, cumulative[end] - overlap_tokens, side='left'))
+        # Shrink the overlap if it would leave no room for the next new sentence
+        fits_next = int(np.searchsorted(cumulative, cumulative[end + 1] - max_tokens, side='left'))
+        start = min(max(next_start, fits_next, start + 1), end)
+
+def page_offsets(page_spans: Optional[List[dict]]) -> Tuple[np.ndarray, np.ndarray, list]:
+    if not page_spans:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), []
+    starts = np.fromiter((span["start"] for span in page_spans), dtype=np.int64, count=len(page_spans))
+    ends = np.fromiter((span["end"] for span in page_spans), dtype=np.int64, count=len(page_spans))
+    return starts, ends, [span["page"] for span in page_spans]
+
+def chunk_section(section_type: str, text: str, page_spans: Optional[List[dict]] = None,
+                  max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                  token_offsets: Optional[TokenOffsets] = None) -> List[dict]:
+    """
+    Split one section's text into overlapping token windows on sentence boundaries, in a single
+    tokenization pass over the section.
+
+    :param page_spans: [{"page", "start", "end"}] character ranges of each source page within `text`.
+    :return: Chunks as {"id", "section", "text", "start", "end", "pages", "tokens"}, where start/end are
+        character offsets into `text` and pages are the source pages the chunk overlaps.
+    """
+    token_offsets = token_offsets or get_token_offsets()
+    starts, ends = sentence_spans(text)
+    if len(starts) == 0:
+        return []
+    token_starts = token_offsets(text)
+    lengths = span_token_counts(token_starts, starts, ends)
+    starts, ends, lengths = split_long_spans(text, starts, ends, lengths, max_tokens, token_starts)
+    cumulative = np.concatenate(([0], np.cumsum(lengths)))
+    page_starts, page_ends, page_numbers = page_offsets(page_spans)
+
+    chunks = []
+    for i, (first, last) in enumerate(window_bounds(lengths, max_tokens, overlap_tokens)):
+        start, end = int(starts[first]), int(ends[last - 1])
+        overlapping = np.nonzero((page_starts < end) & (page_ends > start))[0]
+        chunks.append({
+            "id": f"{section_type}_{i + 1}",
+            "section": section_type,
+            "text": normalize_spaces(text[start:end]),
+            "start": start,
+            "end": end,
+            "pages": [page_numbers[index] for index in overlapping],
+            "tokens": int(cumulative[last] - cumulative[first]),
+        })
+    return chunks
+
+def chunk_sections(section_text_dict: Dict[str, str], section_page_spans: Optional[Dict[str, List[dict]]] = None,
+                   max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                   token_offsets: Optional[TokenOffsets] = None) -> List[dict]:
+    """
+    Chunk every section's full text; chunk ids are the section type and order combined, as before.
+    """
+    section_page_spans = section_page_spans or {}
+    chunks = []
+    for section_type, full_text in section_text_dict.items():
+        chunks.extend(chunk_section(
+            section_type, full_text, section_page_spans.get(section_type),
+            max_tokens=max_tokens, overlap_tokens=overlap_tokens, token_offsets=token_offsets,
+        ))
+    return chunks
@@ -0,0 +1,96 @@
+import httpx, os
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import BinaryIO, Iterable, Optional, Union
+
+from .metrics import CMS_REQUEST_SECONDS, timed
+
+CMS_API_URL = os.getenv('CMS_API_URL', 'http://app-admin:3000/cms/api')
+CMS_TIMEOUT = httpx.Timeout(float(os.getenv('CMS_TIMEOUT', '30')), connect=5.0)
+CMS_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv('CMS_MAX_CONNECTIONS', '100')),
+    max_keepalive_connections=int(os.getenv('CMS_MAX_KEEPALIVE', '20')),
+)
+
+class CMSUnavailable(Exception):
+    """
+    The CMS answered with a server error or rate limit; the request may succeed if retried.
+    """
+
+# Shared keep-alive clients: the async one for API handlers (created inside the running event loop)
+# and a sync one for Celery workers, which report progress from plain threads
+_client: Optional[httpx.AsyncClient] = None
+_sync_client: Optional[httpx.Client] = None
+
+def no_cookies() -> CookieJar:
+    # The clients are shared by all users, so they must never store the cookies Payload sets
+    return CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=CMS_API_URL, timeout=CMS_TIMEOUT, limits=CMS_LIMITS, cookies=no_cookies()
+        )
+    return _client
+
+def get_sync_client() -> httpx.Client:
+    global _sync_client
+    if _sync_client is None or _sync_client.is_closed:
+        _sync_client = httpx.Client(base_url=CMS_API_URL, timeout=CMS_TIMEOUT, limits=CMS_LIMITS, cookies=no_cookies())
+    return _sync_client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def auth_headers(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+@timed(CMS_REQUEST_SECONDS, "get_me")
+async def get_me(token: str) -> httpx.Response:
+    return await get_client().get("/users/me", headers=auth_headers(token))
+
+@timed(CMS_REQUEST_SECONDS, "login")
+async def login(credentials: dict) -> httpx.Response:
+    return await get_client().post("/users/login", json=credentials)
+
+@timed(CMS_REQUEST_SECONDS, "signup")
+async def signup(user_data: dict) -> httpx.Response:
+    return await get_client().post("/users", json=user_data)
+
+@timed(CMS_REQUEST_SECONDS, "logout")
+async def logout(cookies: dict) -> httpx.Response:
+    # Cookies are passed as a header so they are not persisted on the shared client
+    cookie_header = "; ".join(f"{key}={value}" for key, value in cookies.items())
+    return await get_client().post("/users/logout", headers={"Cookie": cookie_header})
+
+@timed(CMS_REQUEST_SECONDS, "upload_media")
+async def upload_media(token: str, filename: str, content: Union[bytes, BinaryIO], mime_type: str) -> httpx.Response:
+    return await get_client().post("/media", headers=auth_headers(token), files={"file": (filename, content, mime_type)})
+
+@timed(CMS_REQUEST_SECONDS, "create_job")
+async def create_job(token: str, job_payload: dict) -> httpx.Response:
+    return await get_client().post("/jobs", json=job_payload, headers=auth_headers(token))
+
+@timed(CMS_REQUEST_SECONDS, "patch_job")
+async def patch_job(token: str, job_id: str, job_data: dict) -> httpx.Response:
+    return await get_client().patch(f"/jobs/{job_id}", json=job_data, headers=auth_headers(token))
+
+@timed(CMS_REQUEST_SECONDS, "list_jobs")
+async def list_jobs(token: str, user_id: str, page: int = 1, limit: int = 10, depth: int = 0,
+                    omit: Iterable[str] = ()) -> httpx.Response:
+    # depth=0 leaves relationships as IDs; `omit` drops fields from each doc (see the Jobs collection's afterRead hook)
+    params = {"where[user][equals]": user_id, "page": page, "limit": limit, "depth": depth, "sort": "-createdAt"}
+    if omit:
+        params["omit"] = ",".join(omit)
+    return await get_client().get("/jobs", params=params, headers=auth_headers(token))
+
+@timed(CMS_REQUEST_SECONDS, "get_job")
+async def get_job(token: str, job_id: str, depth: int = 0) -> httpx.Response:
+    return await get_client().get(f"/jobs/{job_id}", params={"depth": depth}, headers=auth_headers(token))
+
+@timed(CMS_REQUEST_SECONDS, "patch_job")
+def patch_job_sync(token: str, job_id: str, job_data: dict) -> httpx.Response:
+    return get_sync_client().patch(f"/jobs/{job_id}", json=job_data, headers=auth_headers(token))
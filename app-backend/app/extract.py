@@ -1,116 +1,371 @@
-from openai import OpenAI
-from pydantic import BaseModel, Field
-from typing import List, Optional, Union, Literal, Dict, Type
-import re, os
-
-def extract_from_iep(base64_images: list[str]):
-    api_key = os.getenv('OPENAI_API_KEY')
-    client = OpenAI(api_key=api_key)
-
-    IEP_SECTION_TYPES = [
-        "IEPInformationAndEligibility", 
-        "CurrentAcademicAndFunctionalLevels", 
-        "AnnualGoalsAndObjectives", 
-        "FAPEServiceOffer", 
-        "EducationalSettingOffer",
-        "EmergencyInstructionalProgram", 
-        "AssessmentPlan"
-    ]
-
-    # Updated IEPPage model
-    class IEPPage(BaseModel):
-        section_type: Literal[*IEP_SECTION_TYPES] = Field(None, description="An IEP section that can be any of the defined sections")
-        full_text: str = Field(None, description="All extracted full text from the page, ordered in a logical order")
-
-    class IEPInformationAndEligibility(BaseModel):
-        student_details: Optional[str] = Field(None, description="Name and Grade of the student")
-        iep_meeting_information: Optional[dict] = Field(None, description="Dates related to IEP and evaluations")
-        meeting_purpose: Optional[str] = Field(None, description="Purpose of the IEP meeting")
-        disability_identification: Optional[dict] = Field(None, description="Primary and Secondary disabilities")
-        language_proficiency: Optional[dict] = Field(None, description="Language information including EL status")
-        special_education_entry_information: Optional[dict] = Field(None, description="Details about initial entry into special education")
-
-    class FunctionalArea(BaseModel):
-        area_name: Optional[str] = Field(None, description="Name of the functional area, e.g., Reading, Math, Communication")
-        current_level: Optional[str] = Field(None, description="Description of the student's current level of performance in this area")
-        strengths: Optional[List[str]] = Field(None, description="Student's strengths in this area")
-        concerns: Optional[List[str]] = Field(None, description="Parent or teacher concerns related to this area")
-
-    class CurrentAcademicAndFunctionalLevels(BaseModel):
-        functional_areas: Optional[List[FunctionalArea]] = Field(
-            None, description="List of different academic and functional areas with their details"
-        )
+from openai import (
+    AsyncOpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError,
+    LengthFinishReasonError, ContentFilterFinishReasonError,
+)
+from pydantic import ValidationError
+from typing import Any, List, NamedTuple, Optional, Dict, Iterable, Callable, Awaitable
+import os, asyncio, random, math
 
-    class ShortTermObjective(BaseModel):
-        objective: Optional[str] = Field(None, description="Short-term objective description")
-        progress_percentage: Optional[float] = Field(None, description="Optional percentage representation of progress")
-
-    class AnnualGoal(BaseModel):
-        focus_area: Optional[str] = Field(None, description="Specific area like Reading, Math, Communication, etc.")
-        baseline_performance: Optional[str] = Field(None, description="Current level of performance in the focus area")
-        annual_goal: Optional[str] = Field(None, description="Description of the annual goal")
-        progress_percentage: Optional[float] = Field(None, description="Optional percentage representation of goal progress")
-        short_term_objectives: Optional[List[ShortTermObjective]] = Field(
-            None, description="List of short-term objectives for achieving the annual goal"
-        )
+from .extraction_cache import get_extraction_cache, cache_key
+from .iep_schemas import (
+    IEP_SECTION_TYPES, IEP_SECTION_MODEL_MAP, IEPPage, IEPPageBatch, IEPPageSection, RESPONSE_FORMATS, SCHEMA_FINGERPRINTS,
+    build_response_format,
+)
+from .ratelimit import get_token_budget
+from .metrics import MODEL_REQUEST_SECONDS, MODEL_ERRORS, record_model_usage
+from .chunking import chunk_sections
 
-    class AnnualGoalsAndObjectives(BaseModel):
-        goals_and_objectives: Optional[List[AnnualGoal]] = Field(
-            None, description="List of annual goals and corresponding objectives"
-        )
+EXTRACT_MODEL = "gpt-4o-2024-08-06"
+# Pages with a usable embedded text layer only need their section identified, so a cheaper text model is enough
+TEXT_PAGE_MODEL = os.getenv('TEXT_PAGE_MODEL', 'gpt-4o-mini-2024-07-18')
+TEXT_PAGE_SYSTEM_PROMPT = "Given the text of a page of the IEP, identify which section the page belongs under."
+PAGE_SYSTEM_PROMPT = "Given an image of a page of the IEP, identify which section the page belongs under and attempt to extract the full content in logical order."
+BATCH_PAGE_SYSTEM_PROMPT = "You are given images of several pages of an IEP, each preceded by its page index. For every page, identify which section the page belongs under and attempt to extract the full content of that page in logical order. Return exactly one entry per page, with its page index."
+SECTION_SYSTEM_PROMPT = "You are given a full view of all the content under the Section '{section_type}' on a IEP. Extract key points and organize this information into the target model. Use simple language equivalent to a 5th grade reading level. Limit field values to under 3 sentences."
 
-    class FAPEServiceOffer(BaseModel):
-        services_considered: Optional[List[str]] = Field(None, description="Overview of service options considered")
-        least_restrictive_environment: Optional[str] = Field(None, description="Consideration of the least restrictive environment")
-        classroom_accommodations: Optional[List[str]] = Field(None, description="Supports provided in the general education setting")
-        modifications: Optional[List[str]] = Field(None, description="Modifications to curriculum or instruction")
-        support_for_school_personnel: Optional[List[str]] = Field(None, description="Training or consultation for school staff")
-
-    class EducationalSettingOffer(BaseModel):
-        placement_details: Optional[str] = Field(None, description="Type of classroom setting")
-        time_in_general_education: Optional[int] = Field(None, description="Percentage of time in general education")
-        reasons_for_specialized_instruction: Optional[str] = Field(None, description="Rationale for specialized instruction")
-        promotion_criteria: Optional[str] = Field(None, description="Criteria for grade advancement")
-        transition_planning: Optional[str] = Field(None, description="Plans for educational transitions")
-
-    class EmergencyInstructionalProgram(BaseModel):
-        service_delivery_methods: Optional[List[str]] = Field(None, description="How services will be delivered during emergencies")
-        iep_goals_during_emergencies: Optional[List[str]] = Field(None, description="IEP goals to be focused on during emergencies")
-        frequency_and_duration_of_services: Optional[dict] = Field(None, description="Frequency and duration of services during emergencies")
-        transition_back_to_regular_services: Optional[str] = Field(None, description="Plan for transitioning back to regular services")
-
-    class AssessmentDetail(BaseModel):
-        assessment_type: Optional[str] = Field(None, description="Type of assessment, e.g., Cognitive, Behavioral, Academic")
-        purpose: Optional[str] = Field(None, description="Purpose of the assessment")
-        method: Optional[str] = Field(None, description="Method of assessment, e.g., Standardized Test, Observation")
-        timeline: Optional[str] = Field(None, description="Timeline for when the assessment will be conducted")
-        assessor: Optional[str] = Field(None, description="Person or role responsible for conducting the assessment")
-
-    class AssessmentPlan(BaseModel):
-        assessments: Optional[List[AssessmentDetail]] = Field(
-            None, description="List of all assessments planned for the student"
-        )
+# Maximum number of in-flight OpenAI requests per document
+EXTRACT_CONCURRENCY = int(os.getenv('EXTRACT_CONCURRENCY', '8'))
+EXTRACT_MAX_RETRIES = int(os.getenv('EXTRACT_MAX_RETRIES', '6'))
+EXTRACT_BACKOFF_BASE = float(os.getenv('EXTRACT_BACKOFF_BASE', '1.0'))
+EXTRACT_BACKOFF_MAX = float(os.getenv('EXTRACT_BACKOFF_MAX', '60.0'))
+
+# Output allowance added to each request's input estimate when reserving rate-limit budget
+EXTRACT_OUTPUT_TOKEN_ESTIMATE = int(os.getenv('EXTRACT_OUTPUT_TOKEN_ESTIMATE', '800'))
+
+# Several page images per vision request, so the fixed request overhead and system prompt are paid once per batch
+EXTRACT_BATCH_ENABLED = os.getenv('EXTRACT_BATCH_ENABLED', 'true').lower() == 'true'
+EXTRACT_BATCH_MAX_PAGES = int(os.getenv('EXTRACT_BATCH_MAX_PAGES', '4'))
+# Upper bound on estimated image input tokens per batched request
+EXTRACT_BATCH_IMAGE_TOKENS = int(os.getenv('EXTRACT_BATCH_IMAGE_TOKENS', '4000'))
+# Consecutive clean batches before the batch size is allowed to grow again
+EXTRACT_BATCH_GROW_AFTER = int(os.getenv('EXTRACT_BATCH_GROW_AFTER', '3'))
+# How long a partial batch waits for more pages before it is sent anyway
+EXTRACT_BATCH_LINGER = float(os.getenv('EXTRACT_BATCH_LINGER', '0.25'))
+
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+class BatchRejected(Exception):
+    """
+    A batched response was truncated, refused, or did not map one-to-one onto the pages sent.
+    """
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """
+    Input tokens for a high-detail image: scaled to fit 2048x2048, then the short side to 768,
+    and billed at 170 tokens per 512px tile plus 85.
+    """
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+def page_image_tokens(page: dict) -> int:
+    # Defaults to a US Letter page at 150 DPI when the renderer did not report a size
+    return estimate_image_tokens(page.get("width", 1275), page.get("height", 1650))
+
+def estimate_request_tokens(messages: list, image_tokens: int = 0) -> int:
+    """
+    Rough token count for a request (about four characters per text token), used to reserve rate-limit budget
+    before the call; the difference to the reported usage is settled afterwards.
+    """
+    text_chars = 0
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            text_chars += len(content)
+        else:
+            text_chars += sum(len(part.get("text", "")) for part in content)
+    return text_chars // 4 + image_tokens + EXTRACT_OUTPUT_TOKEN_ESTIMATE
+
+class AdaptiveBatchSizer:
+    """
+    Additive-increase / multiplicative-decrease control of the pages per batch: halve after a
+    rejected batch, grow by one after a run of clean ones.
+    """
+    def __init__(self, max_pages: int = EXTRACT_BATCH_MAX_PAGES, token_budget: int = EXTRACT_BATCH_IMAGE_TOKENS):
+        self.max_pages = max_pages
+        self.token_budget = token_budget
+        self.size = max_pages
+        self._clean_batches = 0
+        self.batches = 0
+        self.rejected = 0
+
+    def is_full(self, page_count: int, token_count: int) -> bool:
+        return page_count >= self.size or token_count >= self.token_budget
+
+    def record(self, accepted: bool):
+        self.batches += 1
+        if accepted:
+            self._clean_batches += 1
+            if self._clean_batches >= EXTRACT_BATCH_GROW_AFTER:
+                self.size = min(self.max_pages, self.size + 1)
+                self._clean_batches = 0
+        else:
+            self.rejected += 1
+            self.size = max(1, self.size // 2)
+            self._clean_batches = 0
+
+class PageBatcher:
+    """
+    Collects pages submitted concurrently into batches sized by an AdaptiveBatchSizer. A batch is sent
+    when it is full or after a short linger; rejected batches fall back to one request per page.
+    """
+    def __init__(self, run_batch: Callable[[list], Awaitable[list]], run_single: Callable[[dict], Awaitable],
+                 sizer: AdaptiveBatchSizer, linger: float = EXTRACT_BATCH_LINGER):
+        self.run_batch = run_batch
+        self.run_single = run_single
+        self.sizer = sizer
+        self.linger = linger
+        self._pending = []
+        self._pending_tokens = 0
+        self._timer = None
+        self._tasks = set()
+
+    async def submit(self, page: dict):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((page, future))
+        self._pending_tokens += page_image_tokens(page)
+        if self.sizer.is_full(len(self._pending), self._pending_tokens):
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.linger, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        items, self._pending, self._pending_tokens = self._pending, [], 0
+        task = asyncio.create_task(self._dispatch(items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, items: list):
+        pages = [page for page, _ in items]
+        futures = [future for _, future in items]
+        try:
+            if len(pages) == 1:
+                results = [await self.run_single(pages[0])]
+            else:
+                try:
+                    results = await self.run_batch(pages)
+                    self.sizer.record(accepted=True)
+                except BatchRejected:
+                    self.sizer.record(accepted=False)
+                    results = await asyncio.gather(*(self.run_single(page) for page in pages))
+        except BaseException as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(result)
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """
+    Seconds to wait before retrying, honouring the server's Retry-After header on rate limits.
+    """
+    response = getattr(error, 'response', None)
+    if response is not None:
+        retry_after = response.headers.get('retry-after-ms')
+        if retry_after:
+            return float(retry_after) / 1000
+        retry_after = response.headers.get('retry-after')
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(EXTRACT_BACKOFF_MAX, EXTRACT_BACKOFF_BASE * 2 ** attempt))
+
+class StructuredResponse(NamedTuple):
+    parsed: Any
+    usage: Any
+
+def parse_completion(response_model, completion) -> StructuredResponse:
+    """
+    Validate a structured-output completion against its model, raising the SDK's errors for truncated
+    or filtered replies as its own parse helper would. A refusal parses to None.
+    """
+    choice = completion.choices[0]
+    if choice.finish_reason == "length":
+        raise LengthFinishReasonError(completion=completion)
+    if choice.finish_reason == "content_filter":
+        raise ContentFilterFinishReasonError()
+    message = choice.message
+    parsed = None if message.refusal or message.content is None else response_model.model_validate_json(message.content)
+    return StructuredResponse(parsed, completion.usage)
+
+async def parse_with_retry(client: AsyncOpenAI, semaphore: asyncio.Semaphore, budget=None, user_id: Optional[str] = None,
+                           image_tokens: int = 0, **kwargs):
+    """
+    Run a structured-output completion under the shared concurrency limit, retrying transient failures,
+    and return the reply validated against `response_format`, a pydantic model. With a `budget`, each attempt first waits for room in the rate limit shared across workers.
+    """
+    model = kwargs["model"]
+    response_model = kwargs.pop("response_format")
+    # Registered models use the schema built at import; anything else is converted per call
+    response_format = RESPONSE_FORMATS.get(response_model) or build_response_format(response_model)
+    estimated_tokens = estimate_request_tokens(kwargs["messages"], image_tokens)
+    for attempt in range(EXTRACT_MAX_RETRIES + 1):
+        try:
+            async with semaphore:
+                if budget is not None:
+                    await budget.wait_for_budget(model, estimated_tokens, user_id)
+                with MODEL_REQUEST_SECONDS.labels(model).time():
+                    completion = await client.chat.completions.create(response_format=response_format, **kwargs)
+            response = parse_completion(response_model, completion)
+            record_model_usage(model, response_model.__name__, response.usage)
+            if budget is not None and response.usage is not None:
+                await asyncio.to_thread(budget.adjust, model, response.usage.total_tokens - estimated_tokens, user_id)
+            return response
+        except RETRYABLE_ERRORS as e:
+            MODEL_ERRORS.labels(model, type(e).__name__).inc()
+            if attempt == EXTRACT_MAX_RETRIES:
+                raise
+            delay = retry_delay(e, attempt)
+            if budget is not None and isinstance(e, RateLimitError):
+                await asyncio.to_thread(budget.pause, model, delay)
+            # Sleep outside the semaphore so other pages can use the slot
+            await asyncio.sleep(delay)
+
+async def map_pages_as_ready(pages: Iterable[dict], classify: Callable[[dict], Awaitable], window: int) -> list:
+    """
+    Pull pages from a (possibly blocking) iterator in a worker thread and start classifying each one
+    as soon as it is produced. At most `window` pages are rendered but not yet classified, which keeps
+    memory flat for long documents. Results are returned in page order.
+    """
+    page_iter = iter(pages)
+    done = object()
+    slots = asyncio.Semaphore(window)
+    tasks = []
+
+    async def run(page: dict):
+        try:
+            return await classify(page)
+        finally:
+            slots.release()
+
+    try:
+        while True:
+            await slots.acquire()
+            page = await asyncio.to_thread(next, page_iter, done)
+            if page is done:
+                break
+            tasks.append(asyncio.create_task(run(page)))
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+class IEPExtractor:
+    """
+    Runs the two model passes over a document: classifying pages into sections, then structuring each
+    section. Shares one OpenAI client, concurrency limit, result cache and stats across both passes,
+    so they can run together in one process or as separate pipeline stages.
+    """
+    def __init__(self, concurrency: int = EXTRACT_CONCURRENCY, progress=None, stats: Optional[dict] = None,
+                 user_id: Optional[str] = None):
+        api_key = os.getenv('OPENAI_API_KEY')
+        # Retries are handled by parse_with_retry so they respect the concurrency limit
+        self.client = AsyncOpenAI(api_key=api_key, max_retries=0)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.concurrency = concurrency
+        self.progress = progress
+        self.user_id = user_id
+        # Shared across workers, with each user held to a fair share
+        self.budget = get_token_budget()
+        self.cache = get_extraction_cache()
+        self.stats = {
+            "pages": 0, "text_pages": 0, "image_pages": 0, "page_cache_hits": 0,
+            "sections": 0, "section_cache_hits": 0, "model_calls": 0, "batched_requests": 0,
+            "prompt_tokens": 0, "completion_tokens": 0,
+            # Carried over when the passes run as separate pipeline stages
+            **(stats or {}),
+        }
+        # Character range of each source page within its section's text, for chunk provenance
+        self.section_page_spans: Dict[str, List[dict]] = {}
+        self.batch_sizer = AdaptiveBatchSizer()
+        self.batcher = PageBatcher(self.classify_page_batch, self.classify_single_page, self.batch_sizer) if EXTRACT_BATCH_ENABLED else None
+
+    async def parse(self, image_tokens: int = 0, **kwargs):
+        response = await parse_with_retry(self.client, self.semaphore, budget=self.budget, user_id=self.user_id,
+                                          image_tokens=image_tokens, **kwargs)
+        if response.usage is not None:
+            self.stats["prompt_tokens"] += response.usage.prompt_tokens or 0
+            self.stats["completion_tokens"] += response.usage.completion_tokens or 0
+        return response
+
+    async def close(self):
+        await self.client.close()
 
-    IEP_SECTION_MODEL_MAP: Dict[str, Type[BaseModel]] = {
-        "IEPInformationAndEligibility": IEPInformationAndEligibility,
-        "CurrentAcademicAndFunctionalLevels": CurrentAcademicAndFunctionalLevels,
-        "AnnualGoalsAndObjectives": AnnualGoalsAndObjectives,
-        "FAPEServiceOffer": FAPEServiceOffer,
-        "EducationalSettingOffer": EducationalSettingOffer,
-        "EmergencyInstructionalProgram": EmergencyInstructionalProgram,
-        "AssessmentPlan": AssessmentPlan
-    }
-
-    # Create a dictionary with each section type mapped to an empty string
-    section_text_dict = {section_type: "" for section_type in IEP_SECTION_TYPES}
-    # Slowly populate dictionary with extracted raw text per section
-    for page_image in base64_images:
-        page_extract = client.beta.chat.completions.parse(
-            model="gpt-4o-2024-08-06",
+    async def notify(self, method: str, *args):
+        # Progress reporting does blocking HTTP, so keep it off the event loop
+        if self.progress is not None:
+            await asyncio.to_thread(getattr(self.progress, method), *args)
+
+    def page_cache_key(self, page_image: str) -> str:
+        return cache_key("page", EXTRACT_MODEL, PAGE_SYSTEM_PROMPT, SCHEMA_FINGERPRINTS[IEPPage], page_image)
+
+    async def classify_page(self, page: dict):
+        self.stats["pages"] += 1
+        if page["type"] == "text":
+            self.stats["text_pages"] += 1
+            page_info = await self.classify_text_page_cached(page["content"])
+        else:
+            self.stats["image_pages"] += 1
+            page_info = await self.classify_page_cached(page)
+        await self.notify("page_classified")
+        return page_info
+
+    async def classify_text_page_cached(self, page_text: str):
+        key = cache_key("text-page", TEXT_PAGE_MODEL, TEXT_PAGE_SYSTEM_PROMPT, SCHEMA_FINGERPRINTS[IEPPageSection], page_text)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            self.stats["page_cache_hits"] += 1
+            page_section = IEPPageSection.model_validate_json(cached)
+        else:
+            self.stats["model_calls"] += 1
+            page_extract = await self.parse(
+                model=TEXT_PAGE_MODEL,
+                messages=[
+                    {"role": "system", "content": TEXT_PAGE_SYSTEM_PROMPT},
+                    {"role": "user", "content": f'Page Text: {page_text}'},
+                ],
+                response_format=IEPPageSection
+            )
+            page_section = page_extract.parsed
+            await asyncio.to_thread(self.cache.set, key, page_section.model_dump_json())
+        # The embedded text layer already is the page's full text
+        return IEPPage(section_type=page_section.section_type, full_text=page_text)
+
+    async def classify_page_cached(self, page: dict):
+        key = self.page_cache_key(page["content"])
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            self.stats["page_cache_hits"] += 1
+            return IEPPage.model_validate_json(cached)
+        if self.batcher is not None:
+            return await self.batcher.submit(page)
+        return await self.classify_single_page(page)
+
+    async def classify_single_page(self, page: dict):
+        self.stats["model_calls"] += 1
+        page_extract = await self.parse(
+            image_tokens=page_image_tokens(page),
+            model=EXTRACT_MODEL,
             messages=[
                 {
                     "role": "system",
-                    "content": "Given an image of a page of the IEP, identify which section the page belongs under and attempt to extract the full content in logical order."    
+                    "content": PAGE_SYSTEM_PROMPT
                     },
                 {
                     "role": "user",
@@ -118,7 +373,7 @@ def extract_from_iep(base64_images: list[str]):
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/png;base64,{page_image}"
+                                "url": page["content"]
                             }
                         }
                     ],
@@ -126,85 +381,132 @@ def extract_from_iep(base64_images: list[str]):
             ],
             response_format=IEPPage
         )
-        page_info = page_extract.choices[0].message.parsed
-        section_text_dict[page_info.section_type] += page_info.full_text
-
-    # Extract more structured data once data in organized per section instead of per page
-    section_info_dict = {}
-    for section_type in section_text_dict:
-        section_full_text = section_text_dict[section_type]
-        if section_full_text:
-            section_data = client.beta.chat.completions.parse(
-                model="gpt-4o-2024-08-06",
+        page_info = page_extract.parsed
+        await asyncio.to_thread(self.cache.set, self.page_cache_key(page["content"]), page_info.model_dump_json())
+        return page_info
+
+    async def classify_page_batch(self, batch_pages: List[dict]) -> list:
+        user_content = []
+        for page_index, page in enumerate(batch_pages):
+            user_content.append({"type": "text", "text": f"Page index {page_index}:"})
+            user_content.append({"type": "image_url", "image_url": {"url": page["content"]}})
+
+        self.stats["model_calls"] += 1
+        self.stats["batched_requests"] += 1
+        try:
+            batch_extract = await self.parse(
+                image_tokens=sum(page_image_tokens(page) for page in batch_pages),
+                model=EXTRACT_MODEL,
                 messages=[
-                    {"role": "system", "content": f"You are given a full view of all the content under the Section '{section_type}' on a IEP. Extract key points and organize this information into the target model. Use simple language equivalent to a 5th grade reading level. Limit field values to under 3 sentences."},
-                    {"role": "user", "content": f'Aggregate Text: {section_full_text}'},
+                    {"role": "system", "content": BATCH_PAGE_SYSTEM_PROMPT},
+                    {"role": "user", "content": user_content},
                 ],
-                    response_format=IEP_SECTION_MODEL_MAP[section_type],
+                response_format=IEPPageBatch
             )
-            section_info_dict[section_type]= section_data.choices[0].message.parsed.model_dump()
+        except (LengthFinishReasonError, ContentFilterFinishReasonError, ValidationError) as e:
+            raise BatchRejected(str(e)) from e
 
-    def normalize_spaces(text: str) -> str:
-        """
-        Replace multiple spaces with a single space.
-        """
-        return re.sub(r'\s+', ' ', text).strip()
+        batch = batch_extract.parsed
+        results = {}
+        for batch_page in (batch.pages if batch is not None and batch.pages else []):
+            if batch_page.page_index is None or batch_page.page_index in results or not 0 <= batch_page.page_index < len(batch_pages):
+                raise BatchRejected(f"Unexpected page index {batch_page.page_index}")
+            results[batch_page.page_index] = IEPPage(section_type=batch_page.section_type, full_text=batch_page.full_text)
+        if len(results) != len(batch_pages):
+            raise BatchRejected(f"Expected {len(batch_pages)} pages, got {len(results)}")
 
-    def split_into_sentences(text: str) -> List[str]:
-        """
-        Splits text into sentences using a regular expression.
-        """
-        sentence_endings = re.compile(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?)\s')
-        sentences = sentence_endings.split(text)
-        return [normalize_spaces(sentence.strip()) for sentence in sentences if sentence.strip()]
+        page_infos = [results[page_index] for page_index in range(len(batch_pages))]
+        for page, page_info in zip(batch_pages, page_infos):
+            await asyncio.to_thread(self.cache.set, self.page_cache_key(page["content"]), page_info.model_dump_json())
+        return page_infos
 
-    def chunk_text(sentences: List[str], max_chunk_size: int = 200, overlap: int = 2) -> List[str]:
+    async def classify_pages(self, pages: Iterable[dict]) -> Dict[str, str]:
         """
-        Splits sentences into chunks of specified maximum size.
-        
-        :param sentences: List of sentences to be chunked.
-        :param max_chunk_size: The maximum number of words per chunk.
-        :param overlap: The number of overlapping sentences between consecutive chunks.
-        :return: List of text chunks.
+        Classify pages concurrently as they are produced and return the raw text collected per section.
         """
-        chunks = []
-        current_chunk = []
-        current_length = 0
-        
-        for sentence in sentences:
-            sentence_length = len(sentence.split())
-            if current_length + sentence_length > max_chunk_size:
-                chunks.append(' '.join(current_chunk))
-                current_chunk = current_chunk[-overlap:]  # Keep the last `overlap` sentences for context
-                current_length = sum(len(s.split()) for s in current_chunk)
-            
-            current_chunk.append(sentence)
-            current_length += sentence_length
-        
-        # Add the last chunk
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
-        
-        return chunks
-
-    def chunk_full_text_sections(section_text_dict: Dict[str, str], max_chunk_size: int = 100) -> Dict[str, str]:
+        # Create a dictionary with each section type mapped to an empty string
+        section_text_dict = {section_type: "" for section_type in IEP_SECTION_TYPES}
+        self.section_page_spans = {section_type: [] for section_type in IEP_SECTION_TYPES}
+
+        async def classify(page: dict):
+            return page.get("page"), await self.classify_page(page)
+
+        # Results come back in the original page order
+        page_infos = await map_pages_as_ready(pages, classify, window=self.concurrency * max(2, EXTRACT_BATCH_MAX_PAGES))
+        for page_number, page_info in page_infos:
+            start = len(section_text_dict[page_info.section_type])
+            section_text_dict[page_info.section_type] += page_info.full_text
+            if page_info.full_text:
+                self.section_page_spans[page_info.section_type].append(
+                    {"page": page_number, "start": start, "end": start + len(page_info.full_text)}
+                )
+        self.stats["batch_size"] = self.batch_sizer.size
+        self.stats["rejected_batches"] = self.batch_sizer.rejected
+        return section_text_dict
+
+    async def structure_section(self, section_type: str, section_full_text: str) -> dict:
+        section_info = await self.structure_section_cached(section_type, section_full_text)
+        await self.notify("section_structured", section_type, section_info)
+        return section_info
+
+    async def structure_section_cached(self, section_type: str, section_full_text: str) -> dict:
+        self.stats["sections"] += 1
+        section_model = IEP_SECTION_MODEL_MAP[section_type]
+        system_prompt = SECTION_SYSTEM_PROMPT.format(section_type=section_type)
+        key = cache_key("section", EXTRACT_MODEL, system_prompt, SCHEMA_FINGERPRINTS[section_model], section_full_text)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            self.stats["section_cache_hits"] += 1
+            return section_model.model_validate_json(cached).model_dump()
+
+        self.stats["model_calls"] += 1
+        section_data = await self.parse(
+            model=EXTRACT_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f'Aggregate Text: {section_full_text}'},
+            ],
+                response_format=section_model,
+        )
+        section_info = section_data.parsed
+        await asyncio.to_thread(self.cache.set, key, section_info.model_dump_json())
+        return section_info.model_dump()
+
+    async def structure_sections(self, section_text_dict: Dict[str, str]) -> Dict[str, dict]:
         """
-        Chunk the full text of each section in the section text dictionary.
-        
-        :param section_text_dict: Dictionary where keys are section types and values are full text.
-        :param max_chunk_size: The maximum number of words per chunk.
-        :return: Dictionary with section type and order combined as keys and text chunks as values.
+        Extract more structured data once data in organized per section instead of per page.
         """
-        chunked_sections = {}
-        for section_type, full_text in section_text_dict.items():
-            normalized_text = normalize_spaces(full_text)
-            sentences = split_into_sentences(normalized_text)
-            chunks = chunk_text(sentences, max_chunk_size=max_chunk_size)
-            for i, chunk in enumerate(chunks):
-                chunk_id = f"{section_type}_{i + 1}"
-                chunked_sections[chunk_id] = chunk
-        
-        return chunked_sections
-
-    chunked_sections = chunk_full_text_sections(section_text_dict, max_chunk_size=200)
-    return section_info_dict, chunked_sections
\ No newline at end of file
+        populated_sections = [section_type for section_type in section_text_dict if section_text_dict[section_type]]
+        await self.notify("sections_started", populated_sections)
+        section_results = await asyncio.gather(
+            *(self.structure_section(section_type, section_text_dict[section_type]) for section_type in populated_sections)
+        )
+        return dict(zip(populated_sections, section_results))
+
+    def finish_stats(self) -> dict:
+        stats = self.stats
+        stats["page_cache_hit_rate"] = stats["page_cache_hits"] / stats["pages"] if stats["pages"] else 0.0
+        stats["section_cache_hit_rate"] = stats["section_cache_hits"] / stats["sections"] if stats["sections"] else 0.0
+        return stats
+
+def extract_from_iep(pages: Iterable[dict], concurrency: int = EXTRACT_CONCURRENCY, progress=None, user_id: Optional[str] = None):
+    return asyncio.run(extract_from_iep_async(pages, concurrency=concurrency, progress=progress, user_id=user_id))
+
+async def extract_from_iep_async(pages: Iterable[dict], concurrency: int = EXTRACT_CONCURRENCY, progress=None,
+                                 user_id: Optional[str] = None):
+    """
+    :param pages: Pages in document order, as produced by rasterize.iter_document_pages: either
+        {"type": "text", "content": <embedded text>} or {"type": "image", "content": <data URL>}.
+        May be a lazy generator; pages are sent to the model while later ones are still being rendered.
+    :param progress: Optional JobProgress notified as pages are classified and sections finish.
+    :param user_id: Owner of the document, whose fair share of the OpenAI rate limit the calls count against.
+    """
+    extractor = IEPExtractor(concurrency=concurrency, progress=progress, user_id=user_id)
+    try:
+        section_text_dict = await extractor.classify_pages(pages)
+        section_info_dict = await extractor.structure_sections(section_text_dict)
+    finally:
+        await extractor.close()
+
+    chunked_sections = chunk_sections(section_text_dict, extractor.section_page_spans)
+    return section_info_dict, chunked_sections, extractor.finish_stats()
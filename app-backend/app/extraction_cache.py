@@ -0,0 +1,157 @@
+from typing import Optional
+import hashlib, json, logging, os, tempfile, threading, time
+
+logger = logging.getLogger(__name__)
+
+# 'redis', 'disk' or 'none'
+EXTRACTION_CACHE_BACKEND = os.getenv('EXTRACTION_CACHE_BACKEND', 'redis')
+EXTRACTION_CACHE_URL = os.getenv('EXTRACTION_CACHE_URL', 'redis://redis:6379/1')
+EXTRACTION_CACHE_DIR = os.getenv('EXTRACTION_CACHE_DIR', '/data/extraction-cache')
+EXTRACTION_CACHE_TTL = int(os.getenv('EXTRACTION_CACHE_TTL_DAYS', '30')) * 86400
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv('EXTRACTION_CACHE_MAX_MB', '512')) * 1024 * 1024
+
+def cache_key(kind: str, *parts: str) -> str:
+    """
+    Build a cache key from the kind of result and everything that determines it
+    (model, prompt, response schema and input content).
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return f"iep:{kind}:{digest.hexdigest()}"
+
+def schema_fingerprint(model_cls) -> str:
+    return json.dumps(model_cls.model_json_schema(), sort_keys=True)
+
+class NullExtractionCache:
+    def get(self, key: str) -> Optional[str]:
+        return None
+
+    def set(self, key: str, value: str):
+        pass
+
+class RedisExtractionCache:
+    """
+    Results stored in Redis with a TTL, so eviction is handled by expiry (and maxmemory policy if set).
+    """
+    def __init__(self, url: str, ttl: int):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(key)
+        if value is None:
+            return None
+        # Sliding expiry keeps frequently re-uploaded documents warm
+        self.client.expire(key, self.ttl)
+        return value.decode('utf-8')
+
+    def set(self, key: str, value: str):
+        self.client.set(key, value, ex=self.ttl)
+
+class DiskExtractionCache:
+    """
+    One file per key under a local directory, evicting least recently used files past `max_bytes`.
+    The directory is only scanned when a running byte total crosses the cap, or when the total is
+    older than `resync_seconds`, since other worker processes write to the same directory.
+    """
+    def __init__(self, directory: str, max_bytes: int, resync_seconds: float = 60.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Evicting down to below the cap leaves room for many writes before the next scan
+        self.target_bytes = int(max_bytes * 0.9)
+        self.resync_seconds = resync_seconds
+        self._lock = threading.Lock()
+        self._total = None
+        self._synced_at = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key.replace(':', '_'))
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = f.read()
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, value: str):
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(value)
+            size = f.tell()
+        try:
+            replaced = os.stat(path).st_size
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._total is not None:
+                self._total += size - replaced
+            if self._total is None or self._total > self.max_bytes or time.monotonic() - self._synced_at > self.resync_seconds:
+                self._evict()
+
+    def _evict(self):
+        # Called with the lock held: recount from the directory, then remove the oldest files if over the cap
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith('.part'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= self.target_bytes:
+                    break
+        self._total = total
+        self._synced_at = time.monotonic()
+
+class SafeExtractionCache:
+    """
+    Treat any cache failure as a miss; the cache must never fail a job.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            return self.backend.get(key)
+        except Exception:
+            logger.warning("Extraction cache read failed", exc_info=True)
+            return None
+
+    def set(self, key: str, value: str):
+        try:
+            self.backend.set(key, value)
+        except Exception:
+            logger.warning("Extraction cache write failed", exc_info=True)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_extraction_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                if EXTRACTION_CACHE_BACKEND == 'redis':
+                    backend = RedisExtractionCache(EXTRACTION_CACHE_URL, EXTRACTION_CACHE_TTL)
+                elif EXTRACTION_CACHE_BACKEND == 'disk':
+                    backend = DiskExtractionCache(EXTRACTION_CACHE_DIR, EXTRACTION_CACHE_MAX_BYTES)
+                else:
+                    backend = NullExtractionCache()
+                _cache = SafeExtractionCache(backend)
+    return _cache
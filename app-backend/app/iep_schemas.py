@@ -0,0 +1,123 @@
+from openai import pydantic_function_tool
+from pydantic import BaseModel, Field
+from typing import List, Optional, Literal, Dict, Type
+
+from .extraction_cache import schema_fingerprint
+
+# Page-level and section-level response models for structured outputs, defined once per process.
+
+IEP_SECTION_TYPES = [
+    "IEPInformationAndEligibility", 
+    "CurrentAcademicAndFunctionalLevels", 
+    "AnnualGoalsAndObjectives", 
+    "FAPEServiceOffer", 
+    "EducationalSettingOffer",
+    "EmergencyInstructionalProgram", 
+    "AssessmentPlan"
+]
+
+# Updated IEPPage model
+class IEPPage(BaseModel):
+    section_type: Literal[*IEP_SECTION_TYPES] = Field(None, description="An IEP section that can be any of the defined sections")
+    full_text: str = Field(None, description="All extracted full text from the page, ordered in a logical order")
+
+class IEPBatchPage(IEPPage):
+    page_index: int = Field(None, description="Index of the page, as given before its image")
+
+class IEPPageBatch(BaseModel):
+    pages: List[IEPBatchPage] = Field(None, description="One entry per page image, in any order")
+
+class IEPPageSection(BaseModel):
+    section_type: Literal[*IEP_SECTION_TYPES] = Field(None, description="An IEP section that can be any of the defined sections")
+
+class IEPInformationAndEligibility(BaseModel):
+    student_details: Optional[str] = Field(None, description="Name and Grade of the student")
+    iep_meeting_information: Optional[dict] = Field(None, description="Dates related to IEP and evaluations")
+    meeting_purpose: Optional[str] = Field(None, description="Purpose of the IEP meeting")
+    disability_identification: Optional[dict] = Field(None, description="Primary and Secondary disabilities")
+    language_proficiency: Optional[dict] = Field(None, description="Language information including EL status")
+    special_education_entry_information: Optional[dict] = Field(None, description="Details about initial entry into special education")
+
+class FunctionalArea(BaseModel):
+    area_name: Optional[str] = Field(None, description="Name of the functional area, e.g., Reading, Math, Communication")
+    current_level: Optional[str] = Field(None, description="Description of the student's current level of performance in this area")
+    strengths: Optional[List[str]] = Field(None, description="Student's strengths in this area")
+    concerns: Optional[List[str]] = Field(None, description="Parent or teacher concerns related to this area")
+
+class CurrentAcademicAndFunctionalLevels(BaseModel):
+    functional_areas: Optional[List[FunctionalArea]] = Field(
+        None, description="List of different academic and functional areas with their details"
+    )
+
+class ShortTermObjective(BaseModel):
+    objective: Optional[str] = Field(None, description="Short-term objective description")
+    progress_percentage: Optional[float] = Field(None, description="Optional percentage representation of progress")
+
+class AnnualGoal(BaseModel):
+    focus_area: Optional[str] = Field(None, description="Specific area like Reading, Math, Communication, etc.")
+    baseline_performance: Optional[str] = Field(None, description="Current level of performance in the focus area")
+    annual_goal: Optional[str] = Field(None, description="Description of the annual goal")
+    progress_percentage: Optional[float] = Field(None, description="Optional percentage representation of goal progress")
+    short_term_objectives: Optional[List[ShortTermObjective]] = Field(
+        None, description="List of short-term objectives for achieving the annual goal"
+    )
+
+class AnnualGoalsAndObjectives(BaseModel):
+    goals_and_objectives: Optional[List[AnnualGoal]] = Field(
+        None, description="List of annual goals and corresponding objectives"
+    )
+
+class FAPEServiceOffer(BaseModel):
+    services_considered: Optional[List[str]] = Field(None, description="Overview of service options considered")
+    least_restrictive_environment: Optional[str] = Field(None, description="Consideration of the least restrictive environment")
+    classroom_accommodations: Optional[List[str]] = Field(None, description="Supports provided in the general education setting")
+    modifications: Optional[List[str]] = Field(None, description="Modifications to curriculum or instruction")
+    support_for_school_personnel: Optional[List[str]] = Field(None, description="Training or consultation for school staff")
+
+class EducationalSettingOffer(BaseModel):
+    placement_details: Optional[str] = Field(None, description="Type of classroom setting")
+    time_in_general_education: Optional[int] = Field(None, description="Percentage of time in general education")
+    reasons_for_specialized_instruction: Optional[str] = Field(None, description="Rationale for specialized instruction")
+    promotion_criteria: Optional[str] = Field(None, description="Criteria for grade advancement")
+    transition_planning: Optional[str] = Field(None, description="Plans for educational transitions")
+
+class EmergencyInstructionalProgram(BaseModel):
+    service_delivery_methods: Optional[List[str]] = Field(None, description="How services will be delivered during emergencies")
+    iep_goals_during_emergencies: Optional[List[str]] = Field(None, description="IEP goals to be focused on during emergencies")
+    frequency_and_duration_of_services: Optional[dict] = Field(None, description="Frequency and duration of services during emergencies")
+    transition_back_to_regular_services: Optional[str] = Field(None, description="Plan for transitioning back to regular services")
+
+class AssessmentDetail(BaseModel):
+    assessment_type: Optional[str] = Field(None, description="Type of assessment, e.g., Cognitive, Behavioral, Academic")
+    purpose: Optional[str] = Field(None, description="Purpose of the assessment")
+    method: Optional[str] = Field(None, description="Method of assessment, e.g., Standardized Test, Observation")
+    timeline: Optional[str] = Field(None, description="Timeline for when the assessment will be conducted")
+    assessor: Optional[str] = Field(None, description="Person or role responsible for conducting the assessment")
+
+class AssessmentPlan(BaseModel):
+    assessments: Optional[List[AssessmentDetail]] = Field(
+        None, description="List of all assessments planned for the student"
+    )
+
+IEP_SECTION_MODEL_MAP: Dict[str, Type[BaseModel]] = {
+    "IEPInformationAndEligibility": IEPInformationAndEligibility,
+    "CurrentAcademicAndFunctionalLevels": CurrentAcademicAndFunctionalLevels,
+    "AnnualGoalsAndObjectives": AnnualGoalsAndObjectives,
+    "FAPEServiceOffer": FAPEServiceOffer,
+    "EducationalSettingOffer": EducationalSettingOffer,
+    "EmergencyInstructionalProgram": EmergencyInstructionalProgram,
+    "AssessmentPlan": AssessmentPlan
+}
+
+ALL_MODELS = [IEPPage, IEPBatchPage, IEPPageBatch, IEPPageSection, *IEP_SECTION_MODEL_MAP.values()]
+
+def build_response_format(model: Type[BaseModel]) -> dict:
+    # pydantic_function_tool is the SDK's public route to the strict JSON schema it would send itself
+    schema = pydantic_function_tool(model)["function"]["parameters"]
+    return {"type": "json_schema", "json_schema": {"name": model.__name__, "schema": schema, "strict": True}}
+
+# Built once at import instead of per request: the strict JSON schema sent to OpenAI, and the
+# fingerprint that keys cached results to the schema they were produced with. A model the SDK cannot
+# convert fails the import, so the worker does not start and the API's /ready reports it
+RESPONSE_FORMATS: Dict[Type[BaseModel], dict] = {model: build_response_format(model) for model in ALL_MODELS}
+SCHEMA_FINGERPRINTS: Dict[Type[BaseModel], str] = {model: schema_fingerprint(model) for model in ALL_MODELS}
@@ -0,0 +1,47 @@
+from fastapi import FastAPI, Response
+import asyncio, logging, os, threading
+
+import uvicorn
+
+from .auth import user_cache
+from .jobs import job_list_cache
+from .metrics import render_latest
+from .query_embedder import get_query_embedder
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics and cache statistics are served on their own port rather than by the public app:
+# nginx forwards all of /api/ to the backend, while this port is only exposed to the other containers
+INTERNAL_PORT = int(os.getenv('INTERNAL_PORT', '9808'))
+
+internal_app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
+
+@internal_app.get("/metrics")
+async def metrics():
+    # Collecting reads queue depths from the broker, so keep it off the event loop
+    content, content_type = await asyncio.to_thread(render_latest)
+    return Response(content=content, media_type=content_type)
+
+@internal_app.get("/auth/cache-stats")
+async def auth_cache_stats():
+    return user_cache.stats()
+
+@internal_app.get("/jobs/cache-stats")
+async def jobs_cache_stats():
+    return job_list_cache.stats()
+
+@internal_app.get("/rag/embedding-stats")
+async def embedding_stats():
+    return get_query_embedder().stats()
+
+def start_internal_server(port: int = INTERNAL_PORT):
+    """
+    Serve the internal app from a daemon thread with its own event loop, so scrapes never wait on the API's.
+    Returns the server, whose should_exit stops it, or None when the port is 0.
+    """
+    if not port:
+        return None
+    server = uvicorn.Server(uvicorn.Config(internal_app, host="0.0.0.0", port=port, log_level="warning", lifespan="off"))
+    threading.Thread(target=server.run, name="internal-server", daemon=True).start()
+    logger.info("Serving metrics and cache statistics on port %s", port)
+    return server
@@ -1,15 +1,32 @@
-import requests, base64, mimetypes
-from fastapi import FastAPI, APIRouter, UploadFile, File, Depends, HTTPException, Request
+import asyncio, hashlib, httpx, json, mimetypes, os
+from fastapi import FastAPI, APIRouter, BackgroundTasks, UploadFile, File, Depends, HTTPException, Query, Request, Response
 from pydantic import BaseModel
 
 from typing import List, Dict
 
+from . import cms, blobstore, tracing
 from .auth import get_current_user
-from .celery_config import process_job
+from .tasks import enqueue_process_job
+from .ttl_cache import AsyncTTLCache
 
 app = FastAPI()
 router = APIRouter()
 
+JOBS_PAGE_SIZE = int(os.getenv('JOBS_PAGE_SIZE', '20'))
+JOBS_MAX_PAGE_SIZE = 100
+# Fields of a job returned by the listing; results are fetched one job at a time from /{job_id}/result
+JOB_LIST_FIELDS = ("id", "user", "files", "status", "progress", "createdAt", "updatedAt")
+PAGINATION_FIELDS = ("totalDocs", "limit", "page", "totalPages", "hasPrevPage", "hasNextPage")
+
+# The jobs page polls the listing every few seconds while a job runs. Serialized listings are kept briefly,
+# so repeated polls neither reach the CMS nor re-serialize, and unchanged ones are answered with a 304
+job_list_cache = AsyncTTLCache(
+    maxsize=int(os.getenv('JOBS_CACHE_MAXSIZE', '1024')),
+    ttl=float(os.getenv('JOBS_CACHE_TTL', '2')),
+)
+# Bumped when a user creates a job, so their cached listings are never served without it
+job_list_generations: Dict[str, int] = {}
+
 class Job(BaseModel):
     id: str
     user: str
@@ -20,24 +37,28 @@ class JobCreate(BaseModel):
     status: str = "started"
     files: List[str]
 
-@router.post("/create", dependencies=[Depends(get_current_user)])
+@router.post("/create")
 async def create_job(
     request: Request,
+    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
     user: dict = Depends(get_current_user)
 ):  
-    media_ids, file_data = [], []
+    media_ids, file_refs = [], []
     token = request.cookies.get("payload-token")
     for file in files:
-        file_content = await file.read()
         mime_type = mimetypes.guess_type(file.filename)[0] or "application/octet-stream"
-        file_data.append({"filename": file.filename, "content": base64.b64encode(file_content).decode('utf-8'), "mime_type": mime_type})
-
-        response = requests.post(
-            "http://app-admin:3000/cms/api/media",
-            headers={"Authorization": f"Bearer {token}"},
-            files={"file": (file.filename, file_content, mime_type)},
-        )
+        # Stream to the shared blob store; only the reference travels through the broker
+        file_ref = await blobstore.store_upload(file, mime_type)
+        file_refs.append(file_ref)
+
+        try:
+            # httpx reads file objects synchronously when building the multipart body, so read the blob
+            # in a thread and hand over bytes rather than reading the PDF on the event loop
+            content = await asyncio.to_thread(blobstore.read_bytes, file_ref["sha256"])
+            response = await cms.upload_media(token, file.filename, content, mime_type)
+        except httpx.HTTPError as e:
+            raise HTTPException(status_code=500, detail=str(e))
         if response.status_code != 201:
             raise HTTPException(status_code=response.status_code, detail="File upload failed")
         
@@ -45,45 +66,122 @@ async def create_job(
 
     job_payload = {
         "user": user["user"]["id"],
-        "files": [{"file": media_id} for media_id in media_ids],
+        # The filename is kept on the job so listings can show it without populating the media docs
+        "files": [{"file": media_id, "filename": file.filename} for media_id, file in zip(media_ids, files)],
         "status": "started",
         "resultData": None
     }
 
-    job_response = requests.post(
-        "http://app-admin:3000/cms/api/jobs",
-        json=job_payload,
-        headers={"Authorization": f"Bearer {token}"},
-    )
+    try:
+        job_response = await cms.create_job(token, job_payload)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
     if job_response.status_code != 201:
         raise HTTPException(status_code=job_response.status_code, detail="Job creation failed")
     
     job_id = job_response.json()['doc']['id']
+    job_list_generations[user["user"]["id"]] = job_list_generations.get(user["user"]["id"], 0) + 1
 
     # Trigger the Celery task asynchronously
-    process_job.delay(file_data, job_id, token)
+    with tracing.job_span("jobs.create", job_id):
+        enqueue_process_job(file_refs, job_id, token, user["user"]["id"], trace_context=tracing.inject_context())
+    # Sync background tasks run in the thread pool once the response is sent
+    background_tasks.add_task(blobstore.prune_expired)
 
     # Immediately return a response to the client
     return {"job_id": job_id, "status": "Job started, processing in background"}
 
-@router.get("/get-all", dependencies=[Depends(get_current_user)])
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def conditional_response(request: Request, body: bytes, etag: str) -> Response:
+    """
+    The JSON body, or an empty 304 when the client already holds this version. Browsers revalidate
+    no-cache responses with If-None-Match on their own and hand the cached body back to the page.
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def has_results(doc: dict) -> bool:
+    # The CMS reports this when it leaves resultData out; older CMS builds still send resultData itself
+    if "hasResults" in doc:
+        return bool(doc["hasResults"])
+    return bool(((doc.get("resultData") or {}).get("Result")))
+
+def job_summary(doc: dict) -> dict:
+    summary = {field: doc.get(field) for field in JOB_LIST_FIELDS}
+    summary["hasResults"] = has_results(doc)
+    return summary
+
+def job_owner(doc: dict) -> str:
+    # With depth=0 relationships are IDs, otherwise populated docs
+    user = doc.get("user")
+    return user.get("id") if isinstance(user, dict) else user
+
+@router.get("/get-all")
 async def get_user_jobs(
-    request: Request, 
+    request: Request,
+    page: int = Query(1, ge=1),
+    limit: int = Query(JOBS_PAGE_SIZE, ge=1, le=JOBS_MAX_PAGE_SIZE),
     user: dict = Depends(get_current_user)
 ):
+    """
+    One page of the user's jobs, newest first, without their results.
+    """
     token = request.cookies.get("payload-token")
     user_id = user["user"]["id"]
 
-    response = requests.get(
-        f"http://app-admin:3000/cms/api/jobs?where[user][equals]={user_id}",
-        headers={"Authorization": f"Bearer {token}"},
-    )
-
+    async def load_listing():
+        try:
+            response = await cms.list_jobs(token, user_id, page=page, limit=limit, depth=0, omit=["resultData"])
+        except httpx.HTTPError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail="Failed to fetch jobs")
+
+        listing = response.json()
+        body = json.dumps({
+            "docs": [job_summary(doc) for doc in listing['docs']],
+            **{field: listing.get(field) for field in PAGINATION_FIELDS},
+        }, separators=(',', ':')).encode('utf-8')
+        return body, etag_for(body)
+
+    cache_key = (user_id, job_list_generations.get(user_id, 0), page, limit)
+    body, etag = await job_list_cache.get_or_load(cache_key, load_listing)
+    return conditional_response(request, body, etag)
+
+@router.get("/{job_id}/result")
+async def get_job_result(
+    job_id: str,
+    request: Request,
+    user: dict = Depends(get_current_user)
+):
+    """
+    A single job's status, progress and results (possibly partial while it is still running).
+    """
+    token = request.cookies.get("payload-token")
+    try:
+        response = await cms.get_job(token, job_id, depth=0)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # Jobs of other users are reported as missing rather than forbidden
+    if response.status_code == 404 or (response.status_code == 200 and job_owner(response.json()) != user["user"]["id"]):
+        raise HTTPException(status_code=404, detail="Job not found")
     if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail="Failed to fetch jobs")
-
-    return response.json()['docs']
+        raise HTTPException(status_code=response.status_code, detail="Failed to fetch job")
+
+    doc = response.json()
+    body = json.dumps(
+        {"id": doc.get("id"), "status": doc.get("status"), "progress": doc.get("progress"), "resultData": doc.get("resultData")},
+        separators=(',', ':'),
+    ).encode('utf-8')
+    return conditional_response(request, body, etag_for(body))
 
 app.include_router(router)
 
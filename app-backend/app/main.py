@@ -1,13 +1,46 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
+from prometheus_client import REGISTRY
 from fastapi.middleware.cors import CORSMiddleware
-import os
+from contextlib import asynccontextmanager
+import os, asyncio, logging, time
 
 from .auth import router as auth_router
 from .test import router as test_router
 from .jobs import router as jobs_router
 from .rag import router as rag_router
+from . import resources, cms
+from .internal import start_internal_server
+from .metrics import HTTP_REQUEST_SECONDS, QueueDepthCollector
+from .query_embedder import close_query_embedder
+from .tasks import celery_app, CPU_QUEUE, IO_QUEUE
 
-app = FastAPI(root_path='/api')
+logger = logging.getLogger(__name__)
+
+def warm_up():
+    try:
+        # The extraction schemas are built at import; building them here too makes /ready fail after
+        # an SDK upgrade that breaks them, rather than the first job
+        from . import iep_schemas
+        resources.warm_up()
+    except Exception as e:
+        app.state.startup_error = f"{type(e).__name__}: {e}"
+        logger.exception("Warm-up failed")
+        raise
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the embedding model and Qdrant client off the event loop so the server accepts traffic immediately
+    warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    internal_server = start_internal_server()
+    yield
+    if internal_server is not None:
+        internal_server.should_exit = True
+    warm_up_task.cancel()
+    close_query_embedder()
+    await cms.close_client()
+
+app = FastAPI(root_path='/api', lifespan=lifespan)
+app.state.startup_error = None
 
 # Allow CORS for frontend application
 app.add_middleware(
@@ -18,9 +51,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Queue depth is read from the broker on each scrape of the internal /metrics
+REGISTRY.register(QueueDepthCollector(celery_app, [CPU_QUEUE, IO_QUEUE]))
+
+def route_template(request: Request) -> str:
+    # Path parameters are put back as placeholders, so IDs in URLs do not create new series
+    if request.scope.get("route") is None:
+        return "unmatched"
+    placeholders = {str(value): f"{{{name}}}" for name, value in request.path_params.items()}
+    return "/".join(placeholders.get(segment, segment) for segment in request.scope["path"].split("/"))
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    HTTP_REQUEST_SECONDS.labels(request.method, route_template(request), response.status_code).observe(
+        time.perf_counter() - started
+    )
+    return response
+
 # Include the auth router
 app.include_router(auth_router, prefix="/auth", tags=["User Authentication"])
 app.include_router(test_router, prefix="/test", tags=["Internal Testing"])
 app.include_router(jobs_router, prefix="/jobs", tags=["Processing Jobs"])
 app.include_router(rag_router, prefix="/rag", tags=["Retreival Augmented Generation Functionalities"])
 
+
+@app.get("/ready", tags=["Health"])
+async def ready(response: Response):
+    if not resources.is_ready():
+        response.status_code = 503
+        return {"ready": False, "error": app.state.startup_error}
+    return {"ready": True}
+
@@ -0,0 +1,125 @@
+from functools import wraps
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, start_http_server
+from prometheus_client.core import GaugeMetricFamily
+import asyncio, glob, logging, os, time
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics for the API (served on /metrics) and the Celery workers (served on their own port).
+# Prefork workers need PROMETHEUS_MULTIPROC_DIR, so every child writes its samples where the parent can read them
+WORKER_METRICS_PORT = int(os.getenv('WORKER_METRICS_PORT', '9808'))
+PROMETHEUS_MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+if PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+# Model calls last seconds, pipeline stages up to several minutes for long documents
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+STAGE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'API request latency', ['method', 'route', 'status'], buckets=LATENCY_BUCKETS,
+)
+PIPELINE_STAGE_SECONDS = Histogram(
+    'pipeline_stage_duration_seconds', 'Wall time of each pipeline stage', ['stage'], buckets=STAGE_BUCKETS,
+)
+PIPELINE_STAGE_FAILURES = Counter(
+    'pipeline_stage_failures_total', 'Stages that failed the job after exhausting retries', ['stage'],
+)
+MODEL_REQUEST_SECONDS = Histogram(
+    'openai_request_duration_seconds', 'OpenAI completion latency per attempt', ['model'], buckets=LATENCY_BUCKETS,
+)
+MODEL_CALLS = Counter('openai_calls_total', 'Successful OpenAI completions', ['model', 'schema'])
+MODEL_ERRORS = Counter('openai_errors_total', 'Failed OpenAI attempts, retried or not', ['model', 'error'])
+MODEL_TOKENS = Counter('openai_tokens_total', 'OpenAI tokens used', ['model', 'kind'])
+CMS_REQUEST_SECONDS = Histogram(
+    'cms_request_duration_seconds', 'Payload CMS request latency', ['operation'], buckets=LATENCY_BUCKETS,
+)
+QDRANT_REQUEST_SECONDS = Histogram(
+    'qdrant_request_duration_seconds', 'Qdrant request latency', ['operation'], buckets=LATENCY_BUCKETS,
+)
+
+def timed(histogram: Histogram, *labels: str):
+    """
+    Decorator observing the duration of a sync or async function, whether it returns or raises.
+    """
+    child = histogram.labels(*labels)
+
+    def decorate(function):
+        if asyncio.iscoroutinefunction(function):
+            @wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    child.observe(time.perf_counter() - started)
+            return async_wrapper
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+def record_model_usage(model: str, schema: str, usage):
+    MODEL_CALLS.labels(model, schema).inc()
+    if usage is not None:
+        MODEL_TOKENS.labels(model, "prompt").inc(usage.prompt_tokens or 0)
+        MODEL_TOKENS.labels(model, "completion").inc(usage.completion_tokens or 0)
+
+class QueueDepthCollector:
+    """
+    Reports how many messages wait in each Celery queue, read from the broker at scrape time.
+    """
+    def __init__(self, celery_app, queues: list):
+        self.celery_app = celery_app
+        self.queues = queues
+
+    def describe(self):
+        # Without this the registry would call collect, and so the broker, on registration
+        return []
+
+    def collect(self):
+        depth = GaugeMetricFamily('celery_queue_depth', 'Messages waiting in each Celery queue', labels=['queue'])
+        try:
+            with self.celery_app.connection_for_read(connect_timeout=2) as connection:
+                channel = connection.default_channel
+                for queue in self.queues:
+                    try:
+                        depth.add_metric([queue], channel.queue_declare(queue=queue, passive=True).message_count)
+                    except connection.channel_errors:
+                        # Redis deletes a queue's key once it is empty
+                        depth.add_metric([queue], 0)
+        except Exception:
+            logger.warning("Could not read Celery queue depths", exc_info=True)
+            return
+        yield depth
+
+def render_latest() -> tuple:
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+def start_worker_metrics_server(port: int = WORKER_METRICS_PORT):
+    """
+    Serve the worker's metrics over HTTP. Called once in the worker's main process, before the pool starts.
+    """
+    if not port:
+        return
+    registry = REGISTRY
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        # Samples left by a previous run of this worker would otherwise be added to the new ones
+        for path in glob.glob(os.path.join(PROMETHEUS_MULTIPROC_DIR, '*.db')):
+            os.remove(path)
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    start_http_server(port, registry=registry)
+    logger.info("Serving worker metrics on port %s", port)
+
+def mark_worker_process_dead(pid: int):
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
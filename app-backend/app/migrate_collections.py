@@ -0,0 +1,90 @@
+"""
+Move chunks from the legacy per-job collections (job_<id>) into the shared hybrid collection.
+
+Usage: python -m app.migrate_collections [--cms-token TOKEN] [--delete] [--dry-run]
+
+Per-job collections carry no user information, and /rag/doc-search only returns points of the caller's
+user_id. With --cms-token (the payload-token of an admin, who can read every job) each job's owner is
+looked up in the CMS; otherwise, or when the lookup fails, points get user_id=None and are not searchable
+until the job is re-processed. Re-running the migration is safe: point IDs are derived from job and chunk IDs.
+"""
+from qdrant_client.http import models
+from typing import Optional
+import argparse, asyncio
+
+from . import cms, resources
+from .vectorstore import (
+    QDRANT_COLLECTION, DENSE_VECTOR, SPARSE_VECTOR, UPSERT_BATCH_SIZE, ensure_collection, point_id, to_sparse_vector
+)
+
+LEGACY_PREFIX = "job_"
+
+async def lookup_job_owners(token: str, job_ids: list) -> dict:
+    owners = {}
+    try:
+        for job_id in job_ids:
+            response = await cms.get_job(token, job_id, depth=0)
+            if response.status_code == 200:
+                user = response.json().get("user")
+                owners[job_id] = user.get("id") if isinstance(user, dict) else user
+            else:
+                print(f"job_{job_id}: owner lookup failed with {response.status_code}")
+    finally:
+        await cms.close_client()
+    return owners
+
+def migrate_collection(collection_name: str, user_id: Optional[str] = None, dry_run: bool = False) -> int:
+    qdrant_client = resources.get_qdrant_client()
+    job_id = collection_name[len(LEGACY_PREFIX):]
+    migrated = 0
+    offset = None
+    while True:
+        records, offset = qdrant_client.scroll(
+            collection_name=collection_name,
+            limit=UPSERT_BATCH_SIZE,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        # Legacy points only have a dense vector; add the BM25 vector used by hybrid search
+        sparse_embeddings = resources.get_sparse_model().embed([record.payload["text"] for record in records])
+        points = []
+        for record, sparse_embedding in zip(records, sparse_embeddings):
+            points.append(models.PointStruct(
+                id=point_id(job_id, record.payload["original_id"]),
+                vector={DENSE_VECTOR: record.vector, SPARSE_VECTOR: to_sparse_vector(sparse_embedding)},
+                payload={"job_id": job_id, "user_id": user_id, **record.payload},
+            ))
+        if points and not dry_run:
+            qdrant_client.upsert(collection_name=QDRANT_COLLECTION, points=points, wait=True)
+        migrated += len(points)
+        if offset is None:
+            return migrated
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate per-job Qdrant collections into the shared collection")
+    parser.add_argument("--cms-token", help="Admin payload-token used to look up the owner of each job")
+    parser.add_argument("--delete", action="store_true", help="Delete each legacy collection after it is migrated")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be migrated")
+    args = parser.parse_args()
+
+    qdrant_client = resources.get_qdrant_client()
+    if not args.dry_run:
+        ensure_collection(qdrant_client)
+    legacy_collections = [
+        collection.name for collection in qdrant_client.get_collections().collections
+        if collection.name.startswith(LEGACY_PREFIX)
+    ]
+    owners = {}
+    if args.cms_token:
+        owners = asyncio.run(lookup_job_owners(args.cms_token, [name[len(LEGACY_PREFIX):] for name in legacy_collections]))
+    for collection_name in legacy_collections:
+        user_id = owners.get(collection_name[len(LEGACY_PREFIX):])
+        migrated = migrate_collection(collection_name, user_id=user_id, dry_run=args.dry_run)
+        print(f"{collection_name}: {migrated} points {'found' if args.dry_run else 'migrated'}"
+              f"{'' if user_id else ', without an owner'}")
+        if args.delete and not args.dry_run:
+            qdrant_client.delete_collection(collection_name)
+
+if __name__ == "__main__":
+    main()
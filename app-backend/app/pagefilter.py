@@ -0,0 +1,92 @@
+from PIL import Image
+from typing import List, Optional, Union
+import hashlib, os, re
+import numpy as np
+
+# Pages whose share of dark pixels is below this are treated as blank (separator or empty back sides)
+BLANK_INK_COVERAGE = float(os.getenv('BLANK_INK_COVERAGE', '0.002'))
+# Grey level (0-255) below which a pixel counts as ink
+INK_THRESHOLD = int(os.getenv('INK_THRESHOLD', '160'))
+# Maximum differing bits between two 256-bit difference hashes for pages to count as duplicates
+DUPLICATE_MAX_HAMMING = int(os.getenv('DUPLICATE_MAX_HAMMING', '24'))
+# Hash matches are confirmed on a 64x64 thumbnail, so shared form templates are not merged
+DUPLICATE_MAX_MEAN_DIFF = float(os.getenv('DUPLICATE_MAX_MEAN_DIFF', '8'))
+
+HASH_SIZE = 16
+THUMBNAIL_SIZE = 64
+ANALYSIS_MAX_EDGE = 512
+
+def to_gray_array(image: Image.Image) -> np.ndarray:
+    gray = image.convert('L')
+    if max(gray.size) > ANALYSIS_MAX_EDGE:
+        gray = gray.copy()
+        gray.thumbnail((ANALYSIS_MAX_EDGE, ANALYSIS_MAX_EDGE))
+    return np.asarray(gray, dtype=np.uint8)
+
+def ink_coverage(gray: np.ndarray) -> float:
+    return float(np.count_nonzero(gray < INK_THRESHOLD)) / gray.size
+
+def difference_hash(gray: np.ndarray) -> np.ndarray:
+    """
+    256-bit dHash: compares horizontally adjacent cells of a 17x16 downscale of the page.
+    """
+    resized = np.asarray(Image.fromarray(gray).resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS), dtype=np.int16)
+    return (resized[:, 1:] > resized[:, :-1]).ravel()
+
+def thumbnail(gray: np.ndarray) -> np.ndarray:
+    return np.asarray(Image.fromarray(gray).resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.BILINEAR), dtype=np.int16)
+
+def text_fingerprint(text: str) -> str:
+    return hashlib.sha256(re.sub(r'\s+', ' ', text).strip().lower().encode('utf-8')).hexdigest()
+
+class PageFilter:
+    """
+    Stateful per-document prefilter run between rasterization and extraction. Skips blank pages and
+    pages that repeat an earlier page (double-fed scans, duplicated text pages), recording why.
+    """
+    def __init__(self):
+        self.skipped: List[dict] = []
+        self._hashes: List[np.ndarray] = []
+        self._thumbnails: List[np.ndarray] = []
+        self._hash_pages: List[int] = []
+        self._text_pages = {}
+
+    def check(self, page_number: int, page: Union[str, Image.Image]) -> Optional[dict]:
+        """
+        Return a skip record if the page should not be extracted, otherwise None.
+        :param page: Embedded page text, or the rendered page image.
+        """
+        skip = self._check_text(page_number, page) if isinstance(page, str) else self._check_image(page_number, page)
+        if skip is not None:
+            self.skipped.append(skip)
+        return skip
+
+    def _check_text(self, page_number: int, text: str) -> Optional[dict]:
+        fingerprint = text_fingerprint(text)
+        if fingerprint in self._text_pages:
+            return {"page": page_number, "reason": "duplicate", "duplicate_of": self._text_pages[fingerprint]}
+        self._text_pages[fingerprint] = page_number
+        return None
+
+    def _check_image(self, page_number: int, image: Image.Image) -> Optional[dict]:
+        gray = to_gray_array(image)
+        coverage = ink_coverage(gray)
+        if coverage < BLANK_INK_COVERAGE:
+            return {"page": page_number, "reason": "blank", "ink_coverage": round(coverage, 5)}
+
+        page_hash = difference_hash(gray)
+        page_thumbnail = thumbnail(gray)
+        if self._hashes:
+            distances = np.count_nonzero(np.stack(self._hashes) != page_hash, axis=1)
+            for index in np.flatnonzero(distances <= DUPLICATE_MAX_HAMMING):
+                if np.abs(self._thumbnails[index] - page_thumbnail).mean() <= DUPLICATE_MAX_MEAN_DIFF:
+                    return {
+                        "page": page_number,
+                        "reason": "duplicate",
+                        "duplicate_of": self._hash_pages[index],
+                        "hamming_distance": int(distances[index]),
+                    }
+        self._hashes.append(page_hash)
+        self._thumbnails.append(page_thumbnail)
+        self._hash_pages.append(page_number)
+        return None
@@ -0,0 +1,106 @@
+from typing import Iterable, Iterator, Optional
+import logging, os, threading, time
+
+from . import cms
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between counter-only PATCHes; stage changes and finished sections are sent immediately
+PROGRESS_PATCH_INTERVAL = float(os.getenv('PROGRESS_PATCH_INTERVAL', '2'))
+
+class JobProgress:
+    """
+    Tracks a job through its pipeline stages and mirrors the state, plus any sections finished so far,
+    to the Payload Jobs collection so the frontend can show partial results.
+    """
+    def __init__(self, job_id: str, token: str, pages_total: Optional[int] = None):
+        self.job_id = job_id
+        self.token = token
+        self.state = {
+            "stage": "queued",
+            "pages_total": pages_total,
+            "pages_rasterized": 0,
+            "pages_skipped": 0,
+            "pages_classified": 0,
+            "sections_total": None,
+            "sections_structured": 0,
+            "error": None,
+        }
+        self.results = {}
+        self._lock = threading.Lock()
+        self._last_patch = 0.0
+
+    @classmethod
+    def restore(cls, job_id: str, token: str, state: Optional[dict] = None, results: Optional[dict] = None) -> "JobProgress":
+        """
+        Rebuild a tracker from the state handed over by the previous pipeline stage.
+        """
+        progress = cls(job_id, token)
+        progress.state.update(state or {})
+        progress.results = dict(results or {})
+        return progress
+
+    def _patch(self, force: bool = False, best_effort: bool = True, **job_data) -> Optional[int]:
+        # The lock also serialises PATCHes, so an older snapshot can never overwrite a newer one
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_patch < PROGRESS_PATCH_INTERVAL:
+                return None
+            self._last_patch = now
+            payload = {"progress": dict(self.state), **job_data}
+            if "resultData" not in payload and self.results:
+                payload["resultData"] = {"Result": dict(self.results)}
+            try:
+                return cms.patch_job_sync(self.token, self.job_id, payload).status_code
+            except Exception:
+                if not best_effort:
+                    raise
+                # Progress is best effort; only the final status update may fail the job
+                logger.warning("Failed to report progress for job %s", self.job_id, exc_info=True)
+                return None
+
+    def set_stage(self, stage: str):
+        self.state["stage"] = stage
+        self._patch(force=True)
+
+    def track_rasterized(self, pages: Iterable, page_filter=None) -> Iterator:
+        for page in pages:
+            self.state["pages_rasterized"] += 1
+            if page_filter is not None:
+                self.state["pages_skipped"] = len(page_filter.skipped)
+            self._patch()
+            yield page
+        if page_filter is not None:
+            self.state["pages_skipped"] = len(page_filter.skipped)
+
+    def page_classified(self):
+        self.state["pages_classified"] += 1
+        self._patch()
+
+    def sections_started(self, section_types: list):
+        self.state["stage"] = "structuring"
+        self.state["sections_total"] = len(section_types)
+        self._patch(force=True)
+
+    def section_structured(self, section_type: str, section_info: dict):
+        self.results[section_type] = section_info
+        self.state["sections_structured"] += 1
+        self._patch(force=True)
+
+    def complete(self, results: dict, stats: dict) -> int:
+        self.results = results
+        self.state["stage"] = "completed"
+        # Transport errors propagate and, like a 5xx or 429, let finalize_job retry; other statuses will not change
+        status_code = self._patch(
+            force=True, best_effort=False, status="completed", resultData={"Result": results, "Stats": stats}
+        )
+        if status_code >= 500 or status_code == 429:
+            raise cms.CMSUnavailable(f"Failed to update job status: CMS returned {status_code}")
+        if status_code != 200:
+            raise Exception(f"Failed to update job status: CMS returned {status_code}")
+        return status_code
+
+    def fail(self, error: Exception):
+        self.state["stage"] = "failed"
+        self.state["error"] = f"{type(error).__name__}: {error}"
+        self._patch(force=True, status="terminatedWithError")
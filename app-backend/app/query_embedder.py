@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Tuple
+import asyncio, os, threading
+
+from . import resources
+from .ttl_cache import AsyncTTLCache
+
+# How long the first query in a batch waits for others to join, and the most queries per model run
+QUERY_EMBED_WINDOW = float(os.getenv('QUERY_EMBED_WINDOW_MS', '3')) / 1000
+QUERY_EMBED_MAX_BATCH = int(os.getenv('QUERY_EMBED_MAX_BATCH', '32'))
+# ONNX already uses every core for one batch, so a single worker thread avoids sessions competing for them
+QUERY_EMBED_WORKERS = int(os.getenv('QUERY_EMBED_WORKERS', '1'))
+QUERY_EMBED_CACHE_SIZE = int(os.getenv('QUERY_EMBED_CACHE_SIZE', '2048'))
+QUERY_EMBED_CACHE_TTL = float(os.getenv('QUERY_EMBED_CACHE_TTL', str(24 * 3600)))
+
+# Dense vector and qdrant SparseVector
+QueryVectors = Tuple[List[float], Any]
+
+def normalize_query(query_text: str) -> str:
+    # Both the dense model and BM25 are case-insensitive, so case and spacing do not change the vectors
+    return " ".join(query_text.split()).casefold()
+
+def embed_queries(query_texts: List[str]) -> List[QueryVectors]:
+    """
+    Dense and BM25 query vectors for a batch of queries, in one model run each.
+    """
+    from qdrant_client.http import models
+    dense_vectors = resources.get_embedding_model().query_embed(query_texts)
+    sparse_vectors = resources.get_sparse_model().query_embed(query_texts)
+    return [
+        (dense.tolist(), models.SparseVector(indices=sparse.indices.tolist(), values=sparse.values.tolist()))
+        for dense, sparse in zip(dense_vectors, sparse_vectors)
+    ]
+
+class QueryEmbedder:
+    """
+    Embeds search queries for concurrent requests together: queries arriving within a short window are
+    run as one batch on a dedicated executor, off the event loop. Repeated queries (such as the suggested
+    prompts) are answered from an LRU cache, and identical queries in flight share one embedding.
+    """
+    def __init__(self, window: float = QUERY_EMBED_WINDOW, max_batch: int = QUERY_EMBED_MAX_BATCH,
+                 workers: int = QUERY_EMBED_WORKERS):
+        self.window = window
+        self.max_batch = max_batch
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='query-embed')
+        self.cache = AsyncTTLCache(maxsize=QUERY_EMBED_CACHE_SIZE, ttl=QUERY_EMBED_CACHE_TTL)
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+        self.batches = 0
+        self.queries = 0
+
+    async def embed(self, query_text: str) -> QueryVectors:
+        normalized = normalize_query(query_text)
+        return await self.cache.get_or_load(normalized, lambda: self._submit(normalized))
+
+    async def _submit(self, query_text: str) -> QueryVectors:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query_text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        items, self._pending = self._pending, []
+        task = asyncio.create_task(self._run(items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, items: list):
+        query_texts = [query_text for query_text, _ in items]
+        self.batches += 1
+        self.queries += len(items)
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, embed_queries, query_texts)
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": self.queries / self.batches if self.batches else 0.0,
+            "cache": self.cache.stats(),
+        }
+
+_embedder: Optional[QueryEmbedder] = None
+_embedder_lock = threading.Lock()
+
+def get_query_embedder() -> QueryEmbedder:
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                _embedder = QueryEmbedder()
+    return _embedder
+
+def close_query_embedder():
+    global _embedder
+    with _embedder_lock:
+        if _embedder is not None:
+            _embedder.close()
+            _embedder = None
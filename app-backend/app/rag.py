@@ -1,27 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, Request
-import requests
-from qdrant_client import QdrantClient
-from fastembed.embedding import DefaultEmbedding
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, Request
+from typing import Literal
+from starlette.concurrency import run_in_threadpool
+
+from .auth import get_current_user
+from .query_embedder import get_query_embedder
+
+# Upper bound on results per search, so one request cannot ask Qdrant for the whole collection
+SEARCH_MAX_LIMIT = 100
 
 router = APIRouter()
 
 @router.post("/doc-search")
-async def signup(job_id: str, query_text: str, limit: int=50, score_threshold:float=0.5):
+async def signup(
+    job_id: str,
+    query_text: str,
+    limit: int = Query(10, ge=1, le=SEARCH_MAX_LIMIT),
+    score_threshold: float = 0.5,
+    mode: Literal["hybrid", "dense"] = "hybrid",
+    rerank: bool = False,
+    user: dict = Depends(get_current_user),
+):
+    # Imported on first search: qdrant_client is slow to import and not needed to start serving
+    from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
+    from .vectorstore import search_job
     try:
-        collection_name = f"job_{job_id}"
-        qdrant_client = QdrantClient(url='http://qdrant:6333')
-        fastembed_model = DefaultEmbedding()
-        fast_embeddings = fastembed_model.embed([query_text])
-        query_vector = next(fast_embeddings)
-
-        search_result = qdrant_client.search(
-            collection_name=collection_name,
-            query_vector=query_vector,
-            limit=limit,
-            with_payload=True
+        # Concurrent queries are embedded together in one batch on the embedder's own thread
+        query_vectors = await get_query_embedder().embed(query_text)
+        # The Qdrant client is blocking, so keep the search off the event loop. Points are matched on the
+        # caller's user_id as well, so another user's job ID finds nothing
+        return await run_in_threadpool(
+            search_job, job_id, query_text, limit,
+            score_threshold=score_threshold, mode=mode, rerank=rerank, user_id=user["user"]["id"], query_vectors=query_vectors,
         )
-        # Filter the results based on the score threshold
-        filtered_results = [result for result in search_result if result.score >= score_threshold]
-        return filtered_results
-    except requests.RequestException as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+    except UnexpectedResponse as e:
+        # Qdrant answered with an error, such as a missing collection
+        raise HTTPException(status_code=502, detail=f"Vector store error: {e.status_code} {e.reason_phrase}")
+    except ResponseHandlingException as e:
+        # Qdrant could not be reached or its response could not be read
+        raise HTTPException(status_code=503, detail=f"Vector store unavailable: {e}")
@@ -0,0 +1,154 @@
+from pdf2image import convert_from_path
+from PyPDF2 import PdfReader
+from PIL import Image
+from io import BytesIO
+from typing import Iterator, List, Optional, Union
+import base64, os, unicodedata
+
+from . import blobstore
+from .pagefilter import PageFilter
+
+# Rendering settings tuned for the vision model: it downsamples large images anyway,
+# so rendering above ~150 DPI or 2048px only costs CPU, memory and upload time
+RASTER_DPI = int(os.getenv('RASTER_DPI', '150'))
+RASTER_FORMAT = os.getenv('RASTER_FORMAT', 'JPEG').upper()
+RASTER_GRAYSCALE = os.getenv('RASTER_GRAYSCALE', 'true').lower() == 'true'
+RASTER_JPEG_QUALITY = int(os.getenv('RASTER_JPEG_QUALITY', '80'))
+RASTER_MAX_EDGE = int(os.getenv('RASTER_MAX_EDGE', '2048'))
+# Pages rendered per poppler invocation; small ranges keep memory flat
+RASTER_PAGES_PER_CHUNK = int(os.getenv('RASTER_PAGES_PER_CHUNK', '2'))
+
+# Embedded text is used instead of rendering when a page passes these checks
+TEXT_LAYER_ENABLED = os.getenv('TEXT_LAYER_ENABLED', 'true').lower() == 'true'
+# Visible characters per square inch of page; a sparse but real letter page has well above 3
+TEXT_LAYER_MIN_DENSITY = float(os.getenv('TEXT_LAYER_MIN_DENSITY', '3'))
+TEXT_LAYER_MIN_CHARS = int(os.getenv('TEXT_LAYER_MIN_CHARS', '200'))
+# Share of visible characters that are control, private-use or replacement characters
+TEXT_LAYER_MAX_GARBAGE_RATIO = float(os.getenv('TEXT_LAYER_MAX_GARBAGE_RATIO', '0.05'))
+POINTS_PER_INCH = 72
+
+def render_pdf_pages(pdf_path: str, page_numbers: List[int]) -> Iterator[Image.Image]:
+    """
+    Render the given 1-based page numbers, one poppler call per run of consecutive pages.
+    """
+    runs = []
+    for page_number in page_numbers:
+        if runs and runs[-1][1] == page_number - 1:
+            runs[-1][1] = page_number
+        else:
+            runs.append([page_number, page_number])
+    for first_page, last_page in runs:
+        images = convert_from_path(
+            pdf_path,
+            dpi=RASTER_DPI,
+            first_page=first_page,
+            last_page=last_page,
+            grayscale=RASTER_GRAYSCALE,
+        )
+        for image in images:
+            yield image
+        del images
+
+def text_layer_is_usable(text: str, width_points: float, height_points: float) -> bool:
+    """
+    Decide whether a page's embedded text can stand in for vision extraction, based on how much
+    text there is for the page size and how much of it is garbage from broken font encodings.
+    """
+    visible = [char for char in text if not char.isspace()]
+    if len(visible) < TEXT_LAYER_MIN_CHARS:
+        return False
+    area_square_inches = (width_points / POINTS_PER_INCH) * (height_points / POINTS_PER_INCH)
+    if area_square_inches and len(visible) / area_square_inches < TEXT_LAYER_MIN_DENSITY:
+        return False
+    garbage = sum(1 for char in visible if char == '\ufffd' or unicodedata.category(char) in ('Cc', 'Co', 'Cs'))
+    return garbage / len(visible) <= TEXT_LAYER_MAX_GARBAGE_RATIO
+
+def iter_pdf_pages(pdf_path: str, pages_per_chunk: int = RASTER_PAGES_PER_CHUNK) -> Iterator[Union[str, Image.Image]]:
+    """
+    Yield each page of a PDF in order. Pages with a usable text layer are yielded as their text;
+    the rest are rendered a few pages at a time and yielded as images.
+    """
+    reader = PdfReader(pdf_path)
+    pending_scans: List[int] = []
+
+    def flush_scans():
+        yield from render_pdf_pages(pdf_path, pending_scans)
+        pending_scans.clear()
+
+    for page_index, page in enumerate(reader.pages):
+        text = ""
+        if TEXT_LAYER_ENABLED:
+            try:
+                text = page.extract_text() or ""
+            except Exception:
+                # Malformed content streams are common in scanned PDFs; fall back to rendering
+                text = ""
+        if text and text_layer_is_usable(text, float(page.mediabox.width), float(page.mediabox.height)):
+            yield from flush_scans()
+            yield text
+        else:
+            pending_scans.append(page_index + 1)
+            if len(pending_scans) >= pages_per_chunk:
+                yield from flush_scans()
+    yield from flush_scans()
+
+def encode_page(image: Image.Image) -> str:
+    """
+    Downscale, optionally convert to grayscale, and encode a page as a data URL for the vision model.
+    """
+    if max(image.size) > RASTER_MAX_EDGE:
+        image.thumbnail((RASTER_MAX_EDGE, RASTER_MAX_EDGE))
+    if RASTER_GRAYSCALE and image.mode != 'L':
+        image = image.convert('L')
+    elif RASTER_FORMAT == 'JPEG' and image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB')
+
+    buffered = BytesIO()
+    if RASTER_FORMAT == 'JPEG':
+        image.save(buffered, format='JPEG', quality=RASTER_JPEG_QUALITY, optimize=True)
+    else:
+        image.save(buffered, format=RASTER_FORMAT)
+    mime_type = Image.MIME[RASTER_FORMAT]
+    return f"data:{mime_type};base64,{base64.b64encode(buffered.getvalue()).decode('utf-8')}"
+
+def iter_raw_pages(file_refs: list) -> Iterator[Union[str, Image.Image]]:
+    for file_ref in file_refs:
+        filename = file_ref['filename'].lower()
+
+        if filename.endswith('.pdf'):
+            yield from iter_pdf_pages(blobstore.blob_path(file_ref['sha256']))
+
+        elif filename.endswith(('.jpg', '.jpeg', '.png')):
+            with blobstore.open_blob(file_ref['sha256']) as content:
+                image = Image.open(BytesIO(content))
+                image.load()
+            yield image
+
+def iter_document_pages(file_refs: list, page_filter: Optional[PageFilter] = None) -> Iterator[dict]:
+    """
+    Yield every page of every uploaded file, in upload and page order, as
+    {"type": "text", "content": <text>, "page": n} or {"type": "image", "content": <data URL>, "page": n}.
+    Page numbers are 1-based across all files. Pages rejected by `page_filter` are not yielded.
+    """
+    for page_number, page in enumerate(iter_raw_pages(file_refs), start=1):
+        if page_filter is not None and page_filter.check(page_number, page) is not None:
+            continue
+        if isinstance(page, str):
+            yield {"type": "text", "content": page, "page": page_number}
+        else:
+            content = encode_page(page)
+            # encode_page downscales in place, so this is the size the model will see
+            yield {"type": "image", "content": content, "page": page_number, "width": page.width, "height": page.height}
+
+def count_document_pages(file_refs: list) -> int:
+    """
+    Total page count across uploads, read from the PDF page tree without rendering anything.
+    """
+    page_count = 0
+    for file_ref in file_refs:
+        filename = file_ref['filename'].lower()
+        if filename.endswith('.pdf'):
+            page_count += len(PdfReader(blobstore.blob_path(file_ref['sha256'])).pages)
+        elif filename.endswith(('.jpg', '.jpeg', '.png')):
+            page_count += 1
+    return page_count
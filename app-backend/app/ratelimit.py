@@ -0,0 +1,205 @@
+from typing import Optional, Tuple
+import asyncio, json, logging, os, random, threading, time
+
+logger = logging.getLogger(__name__)
+
+# 'redis' or 'none'
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'redis')
+RATE_LIMIT_URL = os.getenv('RATE_LIMIT_URL', 'redis://redis:6379/2')
+# Organisation-wide limits per model, shared by every worker
+OPENAI_RPM_LIMIT = float(os.getenv('OPENAI_RPM_LIMIT', '500'))
+OPENAI_TPM_LIMIT = float(os.getenv('OPENAI_TPM_LIMIT', '30000'))
+# Optional per-model overrides, e.g. '{"gpt-4o-mini-2024-07-18": [500, 200000]}'
+OPENAI_RATE_LIMITS = json.loads(os.getenv('OPENAI_RATE_LIMITS', '{}'))
+# A user counts towards the fair share while they have made a request within this many seconds
+ACTIVE_USER_WINDOW = float(os.getenv('RATE_LIMIT_ACTIVE_USER_WINDOW', '30'))
+# Longest single sleep while waiting for budget, so waiters re-check their share as other users come and go
+MAX_BUDGET_WAIT = float(os.getenv('RATE_LIMIT_MAX_WAIT', '5'))
+
+# Pages a user may have in flight before their later jobs drop one priority step (0 is highest, 9 lowest)
+PAGES_PER_PRIORITY_STEP = int(os.getenv('PAGES_PER_PRIORITY_STEP', '20'))
+LOWEST_PRIORITY = 9
+USER_PAGES_TTL = 6 * 3600
+
+# Two token buckets per model (requests and tokens, each refilling continuously at its per-minute limit),
+# checked together with the same buckets scaled down to this user's fair share of the limits.
+# Returns "0" once the request is admitted, otherwise the seconds to wait before asking again.
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local rpm = tonumber(ARGV[2])
+local tpm = tonumber(ARGV[3])
+local tokens = tonumber(ARGV[4])
+local user = ARGV[5]
+local window = tonumber(ARGV[6])
+
+local cooldown = tonumber(redis.call('GET', KEYS[4]) or '0')
+if cooldown > now then
+    return tostring(cooldown - now)
+end
+
+redis.call('ZADD', KEYS[3], now, user)
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now - window)
+redis.call('EXPIRE', KEYS[3], math.ceil(window) * 2)
+local active = math.max(1, redis.call('ZCARD', KEYS[3]))
+
+local function load(key, req_cap, tok_cap)
+    local h = redis.call('HMGET', key, 'r', 't', 'ts')
+    local r = tonumber(h[1]) or req_cap
+    local t = tonumber(h[2]) or tok_cap
+    local elapsed = math.max(0, now - (tonumber(h[3]) or now))
+    return math.min(req_cap, r + elapsed * req_cap / 60), math.min(tok_cap, t + elapsed * tok_cap / 60)
+end
+
+local user_rpm, user_tpm = rpm / active, tpm / active
+-- A request larger than a whole bucket would never be admitted, so it only has to wait for a full one
+local need = math.min(tokens, user_tpm)
+local gr, gt = load(KEYS[1], rpm, tpm)
+local ur, ut = load(KEYS[2], user_rpm, user_tpm)
+
+local wait = math.max(0,
+    (1 - gr) * 60 / rpm, (need - gt) * 60 / tpm,
+    (1 - ur) * 60 / user_rpm, (need - ut) * 60 / user_tpm)
+if wait <= 0 then
+    gr, gt, ur, ut = gr - 1, gt - need, ur - 1, ut - need
+end
+redis.call('HSET', KEYS[1], 'r', gr, 't', gt, 'ts', now)
+redis.call('HSET', KEYS[2], 'r', ur, 't', ut, 'ts', now)
+redis.call('EXPIRE', KEYS[1], 120)
+redis.call('EXPIRE', KEYS[2], 120)
+return tostring(wait)
+"""
+
+def model_limits(model: str) -> Tuple[float, float]:
+    rpm, tpm = OPENAI_RATE_LIMITS.get(model, (OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT))
+    return float(rpm), float(tpm)
+
+class NullTokenBudget:
+    def acquire(self, model: str, tokens: int, user_id: Optional[str] = None) -> float:
+        return 0.0
+
+    def adjust(self, model: str, tokens: int, user_id: Optional[str] = None):
+        pass
+
+    def pause(self, model: str, seconds: float):
+        pass
+
+    def reserve_user_pages(self, user_id: Optional[str], pages: int) -> int:
+        return 0
+
+    def release_user_pages(self, user_id: Optional[str], pages: int):
+        pass
+
+class RedisTokenBudget:
+    """
+    Requests/min and tokens/min budget shared by all workers through Redis. Each active user is held to an
+    equal share of the budget, so one large upload cannot starve smaller jobs queued behind it.
+    """
+    def __init__(self, url: str):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        self.acquire_script = self.client.register_script(ACQUIRE_SCRIPT)
+
+    def keys(self, model: str, user_id: Optional[str]) -> list:
+        user = user_id or 'anonymous'
+        return [f"ratelimit:{model}", f"ratelimit:{model}:user:{user}", f"ratelimit:{model}:active", f"ratelimit:{model}:cooldown"]
+
+    def acquire(self, model: str, tokens: int, user_id: Optional[str] = None) -> float:
+        rpm, tpm = model_limits(model)
+        wait = self.acquire_script(
+            keys=self.keys(model, user_id),
+            args=[time.time(), rpm, tpm, tokens, user_id or 'anonymous', ACTIVE_USER_WINDOW],
+        )
+        return float(wait)
+
+    def adjust(self, model: str, tokens: int, user_id: Optional[str] = None):
+        # Settle the difference between the estimate and the usage reported by the API
+        if tokens:
+            pipe = self.client.pipeline()
+            for key in self.keys(model, user_id)[:2]:
+                pipe.hincrbyfloat(key, 't', -tokens)
+            pipe.execute()
+
+    def pause(self, model: str, seconds: float):
+        # A 429 means the organisation limit is already exhausted, so every worker backs off, not just this one
+        until = time.time() + seconds
+        key = self.keys(model, None)[3]
+        current = self.client.get(key)
+        if current is None or float(current) < until:
+            self.client.set(key, until, px=int(seconds * 1000) + 1000)
+
+    def reserve_user_pages(self, user_id: Optional[str], pages: int) -> int:
+        """
+        Count a job's pages against its user and return the Celery priority for it: users with fewer pages
+        in flight get the higher priority lanes.
+        """
+        key = f"ratelimit:pages:{user_id or 'anonymous'}"
+        in_flight = self.client.incrby(key, pages)
+        self.client.expire(key, USER_PAGES_TTL)
+        return min(LOWEST_PRIORITY, max(0, in_flight - pages) // PAGES_PER_PRIORITY_STEP)
+
+    def release_user_pages(self, user_id: Optional[str], pages: int):
+        key = f"ratelimit:pages:{user_id or 'anonymous'}"
+        if self.client.decrby(key, pages) <= 0:
+            self.client.delete(key)
+
+class SafeTokenBudget:
+    """
+    Fails open: if Redis is unavailable requests go through unthrottled and rely on retries instead.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+
+    def acquire(self, model: str, tokens: int, user_id: Optional[str] = None) -> float:
+        try:
+            return self.backend.acquire(model, tokens, user_id)
+        except Exception:
+            logger.warning("Rate limit check failed", exc_info=True)
+            return 0.0
+
+    def adjust(self, model: str, tokens: int, user_id: Optional[str] = None):
+        try:
+            self.backend.adjust(model, tokens, user_id)
+        except Exception:
+            logger.warning("Rate limit adjustment failed", exc_info=True)
+
+    def pause(self, model: str, seconds: float):
+        try:
+            self.backend.pause(model, seconds)
+        except Exception:
+            logger.warning("Rate limit pause failed", exc_info=True)
+
+    def reserve_user_pages(self, user_id: Optional[str], pages: int) -> int:
+        try:
+            return self.backend.reserve_user_pages(user_id, pages)
+        except Exception:
+            logger.warning("Page reservation failed", exc_info=True)
+            return 0
+
+    def release_user_pages(self, user_id: Optional[str], pages: int):
+        try:
+            self.backend.release_user_pages(user_id, pages)
+        except Exception:
+            logger.warning("Page release failed", exc_info=True)
+
+    async def wait_for_budget(self, model: str, tokens: int, user_id: Optional[str] = None):
+        """
+        Block (asynchronously) until the shared budget admits a request of `tokens` estimated tokens.
+        """
+        while True:
+            wait = await asyncio.to_thread(self.acquire, model, tokens, user_id)
+            if wait <= 0:
+                return
+            # Jitter spreads out waiters that were refused at the same moment
+            await asyncio.sleep(min(MAX_BUDGET_WAIT, wait) * random.uniform(1.0, 1.2))
+
+_budget = None
+_budget_lock = threading.Lock()
+
+def get_token_budget() -> SafeTokenBudget:
+    global _budget
+    if _budget is None:
+        with _budget_lock:
+            if _budget is None:
+                backend = RedisTokenBudget(RATE_LIMIT_URL) if RATE_LIMIT_BACKEND == 'redis' else NullTokenBudget()
+                _budget = SafeTokenBudget(backend)
+    return _budget
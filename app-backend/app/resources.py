@@ -0,0 +1,75 @@
+import os, threading
+
+# fastembed (onnxruntime) and qdrant_client are imported inside the getters, so importing this module stays
+# cheap and the API process only pays for them when warm_up runs in the background
+
+# A server URL, or ":memory:" for an in-process store (used by the benchmarks)
+QDRANT_URL = os.getenv('QDRANT_URL', 'http://qdrant:6333')
+SPARSE_MODEL_NAME = os.getenv('SPARSE_MODEL_NAME', 'Qdrant/bm25')
+
+# Process-wide singletons, created lazily on first use and shared across requests/tasks
+_lock = threading.Lock()
+_embedding_model = None
+_sparse_model = None
+_qdrant_client = None
+_ready = threading.Event()
+
+def get_embedding_model() -> "DefaultEmbedding":
+    """
+    Return the shared embedding model, loading the ONNX weights on first call.
+    """
+    global _embedding_model
+    if _embedding_model is None:
+        with _lock:
+            if _embedding_model is None:
+                from fastembed.embedding import DefaultEmbedding
+                _embedding_model = DefaultEmbedding()
+    return _embedding_model
+
+def get_sparse_model() -> "SparseTextEmbedding":
+    """
+    Return the shared sparse (BM25) model used for exact-term matching in hybrid search.
+    """
+    global _sparse_model
+    if _sparse_model is None:
+        with _lock:
+            if _sparse_model is None:
+                from fastembed import SparseTextEmbedding
+                _sparse_model = SparseTextEmbedding(model_name=SPARSE_MODEL_NAME)
+    return _sparse_model
+
+def get_qdrant_client() -> "QdrantClient":
+    """
+    Return the shared Qdrant client, which keeps its HTTP connection pool alive between calls.
+    """
+    global _qdrant_client
+    if _qdrant_client is None:
+        with _lock:
+            if _qdrant_client is None:
+                from qdrant_client import QdrantClient
+                _qdrant_client = QdrantClient(location=QDRANT_URL)
+    return _qdrant_client
+
+def warm_up():
+    """
+    Load the model and run one throwaway inference so the first real query pays no setup cost.
+    """
+    model = get_embedding_model()
+    list(model.embed(["warm up"]))
+    list(get_sparse_model().embed(["warm up"]))
+    get_qdrant_client()
+    _ready.set()
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+def reset():
+    """
+    Drop the shared instances. Needed after fork, since sockets and ONNX sessions are not fork-safe.
+    """
+    global _embedding_model, _sparse_model, _qdrant_client
+    with _lock:
+        _embedding_model = None
+        _sparse_model = None
+        _qdrant_client = None
+        _ready.clear()
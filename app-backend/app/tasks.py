@@ -0,0 +1,51 @@
+from celery import Celery
+import os
+
+# Task interface shared by the API, which only enqueues work by name, and the workers, which implement
+# the tasks in celery_config. Importing this module must stay cheap: no models, PDF or vector store libraries.
+
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://redis:6379/0')
+CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://redis:6379/0')
+
+# CPU-bound stages run on a prefork pool sized to the cores, I/O-bound stages on a high-concurrency thread pool
+CPU_QUEUE = os.getenv('CELERY_CPU_QUEUE', 'cpu')
+IO_QUEUE = os.getenv('CELERY_IO_QUEUE', 'io')
+
+PROCESS_JOB = "process_job"
+RASTERIZE_DOCUMENT = "rasterize_document"
+CLASSIFY_PAGES = "classify_pages"
+STRUCTURE_SECTIONS = "structure_sections"
+EMBED_CHUNKS = "embed_chunks"
+INDEX_POINTS = "index_points"
+FINALIZE_JOB = "finalize_job"
+
+celery_app = Celery('app', broker=CELERY_BROKER_URL, backend=CELERY_RESULT_BACKEND)
+
+celery_app.conf.update(
+    task_serializer='json',
+    accept_content=['json'],
+    result_serializer='json',
+    timezone='UTC',
+    enable_utc=True,
+    task_routes={
+        RASTERIZE_DOCUMENT: {'queue': CPU_QUEUE},
+        EMBED_CHUNKS: {'queue': CPU_QUEUE},
+        PROCESS_JOB: {'queue': IO_QUEUE},
+        CLASSIFY_PAGES: {'queue': IO_QUEUE},
+        STRUCTURE_SECTIONS: {'queue': IO_QUEUE},
+        INDEX_POINTS: {'queue': IO_QUEUE},
+        FINALIZE_JOB: {'queue': IO_QUEUE},
+    },
+    # With acks_late a worker should only hold the task it is working on
+    worker_prefetch_multiplier=1,
+    # Priority lanes on the Redis broker (0 is served first), used to keep small jobs ahead of heavy users
+    broker_transport_options={'queue_order_strategy': 'priority', 'priority_steps': list(range(10)), 'sep': ':'},
+    task_default_priority=0,
+)
+
+def enqueue_process_job(file_refs: list, job_id: str, token: str, user_id: str = None, trace_context: dict = None):
+    """
+    Queue a job for processing. Sent by task name, so the caller never imports the worker implementation.
+    `trace_context` carries the caller's trace to the worker, so the job's spans join it.
+    """
+    return celery_app.send_task(PROCESS_JOB, args=[file_refs, job_id, token, user_id], kwargs={"trace_context": trace_context})
@@ -1,18 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, Response, Request
-import requests
+import httpx
 from pydantic import BaseModel, EmailStr
 
+from . import cms
+
 router = APIRouter()
 
 @router.post("/quick-login")
 async def login(response: Response):
     try:
-        res = requests.post(
-            "http://app-admin:3000/cms/api/users/login",
-            json={"email": "xu.hong@northeastern.edu",
-                "password": "Racecar48!"},
-            headers={"Content-Type": "application/json"},
-        )
+        res = await cms.login({"email": "xu.hong@northeastern.edu",
+            "password": "Racecar48!"})
 
         payload_data = res.json()
         if res.status_code != 200:
@@ -23,7 +21,7 @@ async def login(response: Response):
         if token:
             response.set_cookie(key="payload-token", value=token)
         return payload_data
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/view-cookie")
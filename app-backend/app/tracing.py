@@ -0,0 +1,41 @@
+from contextlib import contextmanager
+from typing import Iterator, Optional
+import os
+
+# Optional spans through the OpenTelemetry API. They are recorded only when tracing is enabled and a tracer
+# provider is configured (for example by running under opentelemetry-instrument); opentelemetry-api itself
+# is an optional dependency. A job's spans in the API and in every pipeline stage share one trace.
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'false').lower() == 'true'
+
+def _opentelemetry():
+    if not TRACING_ENABLED:
+        return None
+    try:
+        from opentelemetry import propagate, trace
+    except ImportError:
+        return None
+    return propagate, trace
+
+@contextmanager
+def job_span(name: str, job_id: str, trace_context: Optional[dict] = None) -> Iterator:
+    """
+    A span tagged with the job ID, continuing the trace in `trace_context` when one is given.
+    """
+    opentelemetry = _opentelemetry()
+    if opentelemetry is None:
+        yield None
+        return
+    propagate, trace = opentelemetry
+    context = propagate.extract(trace_context) if trace_context else None
+    with trace.get_tracer(__name__).start_as_current_span(name, context=context, attributes={"job.id": job_id}) as span:
+        yield span
+
+def inject_context() -> dict:
+    """
+    The current trace context as a carrier dict, to be handed to the worker with the job.
+    """
+    carrier = {}
+    opentelemetry = _opentelemetry()
+    if opentelemetry is not None:
+        opentelemetry[0].inject(carrier)
+    return carrier
@@ -0,0 +1,213 @@
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from typing import Iterable, Iterator, List, Optional, Tuple
+import os, re, uuid
+
+from . import resources
+from .metrics import QDRANT_REQUEST_SECONDS
+
+# All jobs share one collection; points are scoped to a job/user through indexed payload fields
+QDRANT_COLLECTION = os.getenv('QDRANT_COLLECTION', 'iep_chunks')
+DENSE_VECTOR = "dense"
+DENSE_VECTOR_SIZE = 384
+SPARSE_VECTOR = "sparse"
+UPSERT_BATCH_SIZE = int(os.getenv('QDRANT_UPSERT_BATCH_SIZE', '64'))
+# Candidates fetched from each of the dense and sparse searches before fusion
+HYBRID_PREFETCH_LIMIT = int(os.getenv('HYBRID_PREFETCH_LIMIT', '50'))
+# Constant of reciprocal rank fusion, 1 / (k + rank); Qdrant uses the same default
+RRF_K = 60
+# How much full coverage of the query's terms is worth relative to a first-place fused rank
+RERANK_TERM_WEIGHT = float(os.getenv('RERANK_TERM_WEIGHT', str(1 / RRF_K)))
+TERM_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Fixed namespace so the same (job, chunk) always maps to the same point ID
+POINT_ID_NAMESPACE = uuid.UUID('6f1d3c1e-5d0a-4c55-9a8e-3f6c2b7a9e41')
+
+_collection_ready = False
+
+def point_id(job_id: str, chunk_id: str) -> str:
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{job_id}/{chunk_id}"))
+
+def job_filter(job_id: str, user_id: Optional[str] = None) -> models.Filter:
+    conditions = [models.FieldCondition(key="job_id", match=models.MatchValue(value=job_id))]
+    if user_id is not None:
+        conditions.append(models.FieldCondition(key="user_id", match=models.MatchValue(value=user_id)))
+    return models.Filter(must=conditions)
+
+def ensure_collection(qdrant_client: QdrantClient):
+    """
+    Create the shared collection and its payload indexes if they do not exist yet.
+    Safe to call concurrently from several workers.
+    """
+    global _collection_ready
+    if _collection_ready:
+        return
+    if not qdrant_client.collection_exists(QDRANT_COLLECTION):
+        try:
+            qdrant_client.create_collection(
+                collection_name=QDRANT_COLLECTION,
+                vectors_config={DENSE_VECTOR: models.VectorParams(size=DENSE_VECTOR_SIZE, distance=models.Distance.DOT)},
+                sparse_vectors_config={SPARSE_VECTOR: models.SparseVectorParams(modifier=models.Modifier.IDF)},
+            )
+        except Exception:
+            # Another worker may have created it between the check and the create
+            if not qdrant_client.collection_exists(QDRANT_COLLECTION):
+                raise
+    for field_name in ("job_id", "user_id"):
+        qdrant_client.create_payload_index(
+            collection_name=QDRANT_COLLECTION,
+            field_name=field_name,
+            field_schema=models.PayloadSchemaType.KEYWORD,
+        )
+    _collection_ready = True
+
+def iter_batches(items: Iterator, batch_size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def to_sparse_vector(embedding) -> models.SparseVector:
+    return models.SparseVector(indices=embedding.indices.tolist(), values=embedding.values.tolist())
+
+def embed_chunks(job_id: str, user_id: Optional[str], chunks: List[dict], batch_size: int = UPSERT_BATCH_SIZE) -> Iterator[dict]:
+    """
+    Lazily embed (dense and BM25 sparse) a job's chunks, as produced by chunking.chunk_sections,
+    into JSON-serialisable points. Chunk provenance is kept in the payload for highlighting.
+    """
+    fastembed_model = resources.get_embedding_model()
+    sparse_model = resources.get_sparse_model()
+
+    embeddings = fastembed_model.embed((chunk["text"] for chunk in chunks), batch_size=batch_size)
+    sparse_embeddings = sparse_model.embed((chunk["text"] for chunk in chunks), batch_size=batch_size)
+    for chunk, vector, sparse_vector in zip(chunks, embeddings, sparse_embeddings):
+        yield {
+            "id": point_id(job_id, chunk["id"]),
+            "dense": vector.tolist(),
+            "sparse": {"indices": sparse_vector.indices.tolist(), "values": sparse_vector.values.tolist()},
+            "payload": {
+                "job_id": job_id, "user_id": user_id, "original_id": chunk["id"], "text": chunk["text"],
+                "section": chunk.get("section"), "pages": chunk.get("pages"),
+                "start": chunk.get("start"), "end": chunk.get("end"),
+            },
+        }
+
+def upsert_points(job_id: str, points: Iterable[dict], batch_size: int = UPSERT_BATCH_SIZE) -> int:
+    """
+    Upsert embedded points in fixed-size batches, then remove points left over from an earlier attempt.
+    Re-running for the same job is idempotent.
+    """
+    qdrant_client = resources.get_qdrant_client()
+    ensure_collection(qdrant_client)
+
+    point_ids = []
+    for batch in iter_batches(points, batch_size):
+        with QDRANT_REQUEST_SECONDS.labels("upsert").time():
+            qdrant_client.upsert(
+                collection_name=QDRANT_COLLECTION,
+                points=[
+                    models.PointStruct(
+                        id=point["id"],
+                        vector={DENSE_VECTOR: point["dense"], SPARSE_VECTOR: models.SparseVector(**point["sparse"])},
+                        payload=point["payload"],
+                    )
+                    for point in batch
+                ],
+                wait=True,
+            )
+        point_ids.extend(point["id"] for point in batch)
+
+    # Drop points from a previous attempt that produced different chunks
+    stale_filter = job_filter(job_id)
+    stale_filter.must_not = [models.HasIdCondition(has_id=point_ids)] if point_ids else None
+    with QDRANT_REQUEST_SECONDS.labels("delete").time():
+        qdrant_client.delete(collection_name=QDRANT_COLLECTION, points_selector=models.FilterSelector(filter=stale_filter), wait=True)
+    return len(point_ids)
+
+def rerank_by_term_coverage(query_text: str, points: list) -> list:
+    """
+    Lightweight CPU re-ranker: boost fused candidates by the share of query terms they contain verbatim,
+    which matters for acronyms, test names and numbers ("SBAC", "ELPAC", "60 minutes").
+    """
+    query_terms = set(TERM_PATTERN.findall(query_text.lower()))
+    if not query_terms:
+        return points
+    rescored = []
+    for rank, point in enumerate(points):
+        chunk_terms = set(TERM_PATTERN.findall(point.payload.get("text", "").lower()))
+        coverage = len(query_terms & chunk_terms) / len(query_terms)
+        rescored.append((1 / (RRF_K + rank + 1) + RERANK_TERM_WEIGHT * coverage, point))
+    rescored.sort(key=lambda item: item[0], reverse=True)
+    for score, point in rescored:
+        point.score = score
+    return [point for _, point in rescored]
+
+def search_job(
+    job_id: str,
+    query_text: str,
+    limit: int,
+    score_threshold: Optional[float] = None,
+    mode: str = "hybrid",
+    rerank: bool = False,
+    user_id: Optional[str] = None,
+    query_vectors: Optional[Tuple[List[float], models.SparseVector]] = None,
+) -> List[dict]:
+    """
+    Search one job's chunks. "dense" runs a plain vector search; "hybrid" fuses the dense and BM25
+    candidate lists with reciprocal rank fusion inside Qdrant. The score threshold is applied by Qdrant
+    to the dense candidates. Pass `query_vectors` (dense, sparse) when the query is already embedded.
+    """
+    qdrant_client = resources.get_qdrant_client()
+    query_filter = job_filter(job_id, user_id)
+    if query_vectors is None:
+        dense_query = next(resources.get_embedding_model().query_embed(query_text)).tolist()
+        sparse_query = to_sparse_vector(next(resources.get_sparse_model().query_embed(query_text))) if mode != "dense" else None
+    else:
+        dense_query, sparse_query = query_vectors
+    fetch_limit = max(limit, HYBRID_PREFETCH_LIMIT) if rerank else limit
+
+    with QDRANT_REQUEST_SECONDS.labels(f"query_{mode}").time():
+        if mode == "dense":
+            points = qdrant_client.query_points(
+                collection_name=QDRANT_COLLECTION,
+                query=dense_query,
+                using=DENSE_VECTOR,
+                query_filter=query_filter,
+                score_threshold=score_threshold,
+                limit=fetch_limit,
+                with_payload=True,
+            ).points
+        else:
+            points = qdrant_client.query_points(
+                collection_name=QDRANT_COLLECTION,
+                prefetch=[
+                    models.Prefetch(
+                        query=dense_query, using=DENSE_VECTOR, filter=query_filter,
+                        score_threshold=score_threshold, limit=HYBRID_PREFETCH_LIMIT,
+                    ),
+                    models.Prefetch(query=sparse_query, using=SPARSE_VECTOR, filter=query_filter, limit=HYBRID_PREFETCH_LIMIT),
+                ],
+                query=models.FusionQuery(fusion=models.Fusion.RRF),
+                limit=fetch_limit,
+                with_payload=True,
+            ).points
+
+    if rerank:
+        points = rerank_by_term_coverage(query_text, points)[:limit]
+    return [
+        {
+            "id": point.id,
+            "score": point.score,
+            "original_id": point.payload.get("original_id"),
+            "text": point.payload.get("text"),
+            "section": point.payload.get("section"),
+            "pages": point.payload.get("pages"),
+            "start": point.payload.get("start"),
+            "end": point.payload.get("end"),
+        }
+        for point in points
+    ]
@@ -0,0 +1,124 @@
+"""
+Micro-benchmark for app.chunking on large synthetic IEP text.
+
+    python -m benchmarks.chunking_benchmark [--pages 400] [--repeat 5] [--tokenizer approx|model]
+
+Compares the chunking engine against the previous word-count chunker that extract.py used to define inline.
+"""
+from typing import Dict, List
+import argparse, random, re, statistics, time
+
+from app import chunking
+
+SECTION_TYPES = ["Student Profile", "Present Levels", "Goals", "Services", "Accommodations", "Assessment"]
+VOCABULARY = (
+    "student reading fluency comprehension math computation goal objective benchmark progress teacher parent "
+    "classroom accommodations services speech language occupational therapy minutes weekly assessment "
+    "baseline measured accuracy trials independently prompting support behavior attention writing "
+    "instruction grade level curriculum evaluation eligibility placement transition inclusion"
+).split()
+ABBREVIATIONS = ["Dr. Smith", "Ms. Lee", "e.g. fluency", "i.e. weekly", "U.S. history"]
+
+def synthetic_section(rng: random.Random, pages: int, chars_per_page: int = 3000):
+    """
+    Page texts of realistic-looking sentences, with abbreviations, questions and occasional run-on table rows.
+    """
+    page_texts = []
+    for _ in range(pages):
+        sentences, length = [], 0
+        while length < chars_per_page:
+            if rng.random() < 0.02:
+                # OCR'd tables come through as one long "sentence"
+                sentence = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(300, 600)))
+            else:
+                words = [rng.choice(VOCABULARY) for _ in range(rng.randint(6, 28))]
+                if rng.random() < 0.2:
+                    words.insert(rng.randrange(len(words)), rng.choice(ABBREVIATIONS))
+                sentence = " ".join(words).capitalize() + rng.choice([".", ".", ".", "?"])
+            sentences.append(sentence)
+            length += len(sentence) + 1
+        page_texts.append(rng.choice([" ", "  ", "\n"]).join(sentences) + "\n")
+    return page_texts
+
+def synthetic_document(pages: int, seed: int = 0):
+    rng = random.Random(seed)
+    section_text_dict, section_page_spans = {}, {}
+    page_number = 0
+    for index, section_type in enumerate(SECTION_TYPES):
+        section_pages = pages // len(SECTION_TYPES) + (1 if index < pages % len(SECTION_TYPES) else 0)
+        text, spans = "", []
+        for page_text in synthetic_section(rng, section_pages):
+            page_number += 1
+            spans.append({"page": page_number, "start": len(text), "end": len(text) + len(page_text)})
+            text += page_text
+        section_text_dict[section_type] = text
+        section_page_spans[section_type] = spans
+    return section_text_dict, section_page_spans
+
+def legacy_chunk_sections(section_text_dict: Dict[str, str], max_chunk_size: int = 200) -> Dict[str, str]:
+    # The chunker extract.py previously rebuilt on every call, kept as the baseline
+    def normalize_spaces(text: str) -> str:
+        return re.sub(r'\s+', ' ', text).strip()
+
+    def split_into_sentences(text: str) -> List[str]:
+        sentence_endings = re.compile(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?)\s')
+        sentences = sentence_endings.split(text)
+        return [normalize_spaces(sentence.strip()) for sentence in sentences if sentence.strip()]
+
+    def chunk_text(sentences: List[str], max_chunk_size: int = 200, overlap: int = 2) -> List[str]:
+        chunks, current_chunk, current_length = [], [], 0
+        for sentence in sentences:
+            sentence_length = len(sentence.split())
+            if current_length + sentence_length > max_chunk_size:
+                chunks.append(' '.join(current_chunk))
+                current_chunk = current_chunk[-overlap:]
+                current_length = sum(len(s.split()) for s in current_chunk)
+            current_chunk.append(sentence)
+            current_length += sentence_length
+        if current_chunk:
+            chunks.append(' '.join(current_chunk))
+        return chunks
+
+    chunked_sections = {}
+    for section_type, full_text in section_text_dict.items():
+        for i, chunk in enumerate(chunk_text(split_into_sentences(normalize_spaces(full_text)), max_chunk_size=max_chunk_size)):
+            chunked_sections[f"{section_type}_{i + 1}"] = chunk
+    return chunked_sections
+
+def best_of(repeat: int, run) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return min(timings), statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=400)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--tokenizer', choices=['approx', 'model'], default='approx',
+                        help="'model' loads the embedding model's tokenizer (downloads it on first use)")
+    args = parser.parse_args()
+
+    section_text_dict, section_page_spans = synthetic_document(args.pages)
+    total_chars = sum(len(text) for text in section_text_dict.values())
+    token_offsets = chunking.model_token_offsets() if args.tokenizer == 'model' else chunking.approx_token_offsets
+    print(f"{args.pages} pages, {total_chars / 1e6:.1f}M characters, tokenizer={args.tokenizer}")
+
+    legacy = legacy_chunk_sections(section_text_dict)
+    chunks = chunking.chunk_sections(section_text_dict, section_page_spans, token_offsets=token_offsets)
+    token_counts = [len(token_offsets(chunk["text"])) for chunk in chunks]
+    print(f"legacy: {len(legacy)} chunks, longest {max(len(chunk.split()) for chunk in legacy.values())} words")
+    print(f"engine: {len(chunks)} chunks, longest {max(token_counts)} tokens "
+          f"(limit {chunking.CHUNK_MAX_TOKENS}), {sum(len(chunk['pages']) > 1 for chunk in chunks)} span a page break")
+
+    for name, run in [
+        ("legacy", lambda: legacy_chunk_sections(section_text_dict)),
+        ("engine", lambda: chunking.chunk_sections(section_text_dict, section_page_spans, token_offsets=token_offsets)),
+    ]:
+        best, median = best_of(args.repeat, run)
+        print(f"{name}: best {best * 1000:.1f} ms, median {median * 1000:.1f} ms, {total_chars / best / 1e6:.1f}M chars/s")
+
+if __name__ == '__main__':
+    main()
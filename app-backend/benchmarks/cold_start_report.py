@@ -0,0 +1,93 @@
+"""
+Cold-start report for the API and worker processes, and the per-job cost of building extraction schemas.
+
+    python -m benchmarks.cold_start_report [--runs 5] [--requests 40]
+
+Each import is timed in a fresh interpreter, as a container would start. --requests is the number of
+OpenAI calls in a typical job (pages plus sections), used to scale the per-request schema work.
+"""
+import argparse, inspect, json, os, statistics, subprocess, sys, time
+
+HEAVY_MODULES = ["fastembed", "onnxruntime", "qdrant_client", "pdf2image", "PyPDF2", "openai", "numpy"]
+TARGETS = {"api": "app.main", "worker": "app.celery_config"}
+
+def time_import(module: str) -> dict:
+    code = (
+        "import sys, time, json\n"
+        "started = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - started\n"
+        f"print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "unused")}
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def slowest_imports(module: str, top: int = 8) -> list:
+    # -X importtime reports cumulative microseconds per module on stderr
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "unused")}
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, env=env, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if not name.startswith(" ") and "." not in name.strip():
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+def schema_overhead(requests: int, runs: int) -> tuple:
+    """
+    Seconds per job spent on schemas: the previous path, which redefined the models on every job and had
+    the SDK convert them to a strict JSON schema on every request, against looking the schema and its
+    fingerprint up in the import-time registry.
+    """
+    os.environ.setdefault("OPENAI_API_KEY", "unused")
+    from openai import pydantic_function_tool
+    from app import iep_schemas
+
+    source = inspect.getsource(iep_schemas)
+    model_source = source[:source.index("ALL_MODELS =")]
+
+    def rebuilt_job():
+        namespace = {"__name__": "app.rebuilt_schemas", "__package__": "app"}
+        exec(model_source, namespace)
+        page_model = namespace["IEPPage"]
+        for _ in range(requests):
+            pydantic_function_tool(page_model)
+
+    def registry_job():
+        for _ in range(requests):
+            iep_schemas.RESPONSE_FORMATS[iep_schemas.IEPPage]
+            iep_schemas.SCHEMA_FINGERPRINTS[iep_schemas.IEPPage]
+
+    timings = []
+    for job in (rebuilt_job, registry_job):
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            job()
+            samples.append(time.perf_counter() - started)
+        timings.append(statistics.median(samples))
+    return tuple(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=40)
+    args = parser.parse_args()
+
+    for name, module in TARGETS.items():
+        results = [time_import(module) for _ in range(args.runs)]
+        seconds = statistics.median(result["seconds"] for result in results)
+        print(f"{name} ({module}): import {seconds:.2f}s median of {args.runs}, heavy modules loaded: "
+              f"{', '.join(results[-1]['loaded']) or 'none'}")
+        for cumulative, imported in slowest_imports(module):
+            print(f"    {cumulative / 1e6:6.2f}s  {imported}")
+
+    rebuilt, registry = schema_overhead(args.requests, args.runs)
+    print(f"schemas per job ({args.requests} requests): rebuilt {rebuilt * 1000:.1f} ms, registry {registry * 1000:.3f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""
+End-to-end benchmark of the API and the Celery pipeline against local fakes, needing no network or services.
+
+    python -m benchmarks.e2e_benchmark [--sizes 2,10,40] [--scanned-ratio 0.25] [--embeddings hashed|real]
+        [--openai-latency 0.3] [--openai-429-ratio 0.02] [--requests 200] [--concurrency 16] [--output report.json]
+
+Everything runs in this one process: a mock OpenAI server (see benchmarks/fakes.py), a stub Payload CMS,
+the API under uvicorn, and a threaded Celery worker on an in-memory broker, with Qdrant in local in-memory
+mode and blobs in a temporary directory. Peak RSS therefore covers all of them together, and the load generator
+shares the interpreter with the servers, so compare req/s between runs rather than with production.
+
+For each document size the real pipeline processes one synthetic PDF, reporting wall time per stage, model
+calls and 429s, then /jobs/get-all, /rag/doc-search and /jobs/create are loaded with concurrent requests.
+Scanned pages need poppler (pdftoppm); --embeddings real needs the fastembed models (downloaded on first use).
+"""
+import argparse, asyncio, json, os, resource, shutil, socket, statistics, sys, tempfile, time
+from collections import defaultdict
+
+SEARCH_QUERIES = [
+    "reading comprehension goals", "speech and language services", "classroom accommodations",
+    "how many minutes of occupational therapy", "baseline for math computation", "behavior support plan",
+    "placement in general education", "assessment timeline", "progress on writing objectives", "eligibility",
+]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def configure_environment(args, ports: dict, workdir: str):
+    # Read by the app modules at import, so this runs before any of them are imported
+    os.environ.update({
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{ports['openai']}/v1",
+        "CMS_API_URL": f"http://127.0.0.1:{ports['payload']}",
+        "QDRANT_URL": ":memory:",
+        "BLOB_STORE_DIR": os.path.join(workdir, "blobs"),
+        "EXTRACTION_CACHE_BACKEND": "none",
+        "RATE_LIMIT_BACKEND": "none",
+        "CELERY_BROKER_URL": "memory://",
+        "CELERY_RESULT_BACKEND": "cache+memory://",
+        "PROGRESS_PATCH_INTERVAL": "0.5",
+        "INTERNAL_PORT": str(ports["internal"]),
+    })
+    if args.embeddings == "hashed":
+        os.environ["CHUNK_TOKENIZER"] = "approx"
+
+class StageTimer:
+    """
+    Wall time per task name and job, from Celery's prerun/postrun signals.
+    """
+    def __init__(self):
+        self.started = {}
+        self.seconds = defaultdict(lambda: defaultdict(float))
+
+    @staticmethod
+    def job_id(args: tuple) -> str:
+        # process_job takes (file_refs, job_id, ...); every stage takes the job dict
+        if args and isinstance(args[0], dict):
+            return args[0]["job_id"]
+        return args[1] if len(args) > 1 else None
+
+    def connect(self):
+        from celery.signals import task_prerun, task_postrun
+        task_prerun.connect(self.prerun, weak=False)
+        task_postrun.connect(self.postrun, weak=False)
+
+    def prerun(self, task_id=None, task=None, args=(), **kwargs):
+        self.started[task_id] = time.perf_counter()
+
+    def postrun(self, task_id=None, task=None, args=(), **kwargs):
+        started = self.started.pop(task_id, None)
+        if started is not None:
+            self.seconds[self.job_id(args)][task.name] += time.perf_counter() - started
+
+async def wait_for_job(payload_app, job_id: str, timeout: float) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = payload_app.state.jobs.get(job_id, {})
+        if job.get("status") in ("completed", "terminatedWithError"):
+            return job
+        await asyncio.sleep(0.05)
+    raise TimeoutError(f"Job {job_id} did not finish within {timeout}s")
+
+async def wait_for_stage(timer: StageTimer, job_id: str, task_name: str, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while task_name not in timer.seconds[job_id] and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+async def wait_until_ready(client, timeout: float = 600):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if (await client.get("/ready")).status_code == 200:
+            return
+        await asyncio.sleep(0.1)
+    raise TimeoutError("API did not become ready")
+
+async def create_job(client, pdf: bytes, name: str) -> str:
+    response = await client.post("/jobs/create", files={"files": (name, pdf, "application/pdf")})
+    response.raise_for_status()
+    return response.json()["job_id"]
+
+async def run_pipeline(client, args, payload_app, openai_app, timer) -> list:
+    from benchmarks.synthetic_pdfs import synthetic_iep_pdf
+    from app.tasks import FINALIZE_JOB
+    results = []
+    for seed, pages in enumerate(args.sizes):
+        pdf = synthetic_iep_pdf(pages, args.scanned_ratio, seed=seed)
+        calls_before, limited_before = sum(openai_app.state.calls.values()), openai_app.state.rate_limited
+        started = time.perf_counter()
+        job_id = await create_job(client, pdf, f"iep-{pages}.pdf")
+        job = await wait_for_job(payload_app, job_id, args.timeout)
+        elapsed = time.perf_counter() - started
+        if job["status"] == "completed":
+            # The final status is sent from inside the last stage, just before its timing is recorded
+            await wait_for_stage(timer, job_id, FINALIZE_JOB)
+        stats = (job.get("resultData") or {}).get("Stats") or {}
+        results.append({
+            "pages": pages,
+            "job_id": job_id,
+            "status": job["status"],
+            "seconds": elapsed,
+            "stages": dict(timer.seconds[job_id]),
+            # Time outside the stages: the upload, broker hand-offs and waiting for a free worker
+            "queued_seconds": elapsed - sum(timer.seconds[job_id].values()),
+            "model_calls": sum(openai_app.state.calls.values()) - calls_before,
+            "rate_limited": openai_app.state.rate_limited - limited_before,
+            "text_pages": stats.get("text_pages"),
+            "image_pages": stats.get("image_pages"),
+            "prompt_tokens": stats.get("prompt_tokens"),
+            "completion_tokens": stats.get("completion_tokens"),
+            "peak_rss_mb": peak_rss_mb(),
+        })
+    return results
+
+async def load_endpoint(client, send, requests: int, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await send(index)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+async def run_load(client, args, payload_app, job_ids: list) -> dict:
+    from benchmarks.synthetic_pdfs import synthetic_iep_pdf
+    small_pdf = synthetic_iep_pdf(2, 0.0, seed=len(args.sizes))
+    results = {
+        "/jobs/get-all": await load_endpoint(
+            client, lambda index: client.get("/jobs/get-all"), args.requests, args.concurrency),
+        "/rag/doc-search": await load_endpoint(
+            client, lambda index: client.post("/rag/doc-search", params={
+                "job_id": job_ids[index % len(job_ids)], "query_text": SEARCH_QUERIES[index % len(SEARCH_QUERIES)],
+            }), args.requests, args.concurrency),
+    }
+    jobs_before = set(payload_app.state.jobs)
+    results["/jobs/create"] = await load_endpoint(
+        client, lambda index: client.post("/jobs/create", files={"files": (f"load-{index}.pdf", small_pdf, "application/pdf")}),
+        args.create_requests, args.concurrency)
+    # Let the jobs just created drain, so their cost shows up as pipeline throughput rather than as a hang on exit
+    started = time.perf_counter()
+    new_jobs = [job_id for job_id in payload_app.state.jobs if job_id not in jobs_before]
+    drained = await asyncio.gather(*(wait_for_job(payload_app, job_id, args.timeout) for job_id in new_jobs))
+    results["/jobs/create"]["drain_seconds"] = time.perf_counter() - started
+    results["/jobs/create"]["failed_jobs"] = sum(job["status"] != "completed" for job in drained)
+    return results
+
+def print_report(report: dict):
+    print(f"startup: peak RSS {report['startup_rss_mb']:.0f} MB")
+    print(f"{'pages':>6} {'status':>20} {'total s':>8} {'queued s':>8} {'calls':>6} {'429s':>5} {'RSS MB':>7}  stages (s)")
+    for row in report["pipeline"]:
+        stages = ", ".join(f"{name.rsplit('.', 1)[-1]} {seconds:.2f}" for name, seconds in row["stages"].items())
+        print(f"{row['pages']:>6} {row['status']:>20} {row['seconds']:>8.2f} {row['queued_seconds']:>8.2f} {row['model_calls']:>6} "
+              f"{row['rate_limited']:>5} {row['peak_rss_mb']:>7.0f}  {stages}")
+    print(f"{'endpoint':<18} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>7}")
+    for endpoint, row in report["load"].items():
+        print(f"{endpoint:<18} {row['requests']:>8} {row['errors']:>6} {row['rps']:>8.1f} "
+              f"{row['p50_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['peak_rss_mb']:>7.0f}")
+    created = report['load']['/jobs/create']
+    print(f"/jobs/create jobs drained in {created['drain_seconds']:.1f}s, {created['failed_jobs']} failed")
+    print(f"model calls by schema: {report['model_calls']}, 429s: {report['rate_limited']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')], default=[2, 10, 40],
+                        help="pages per synthetic document, comma separated")
+    parser.add_argument('--scanned-ratio', type=float, default=0.25, help="share of pages without a text layer")
+    parser.add_argument('--embeddings', choices=['hashed', 'real'], default='hashed',
+                        help="'real' loads the fastembed models; 'hashed' leaves ONNX out of the measurement")
+    parser.add_argument('--openai-latency', type=float, default=0.3, help="mean seconds per mock completion")
+    parser.add_argument('--openai-429-ratio', type=float, default=0.02, help="share of mock completions rate limited")
+    parser.add_argument('--worker-concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help="requests per read endpoint")
+    parser.add_argument('--create-requests', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--timeout', type=float, default=600, help="seconds to wait for one job")
+    parser.add_argument('--output', help="also write the report as JSON to this path")
+    args = parser.parse_args()
+
+    if args.scanned_ratio > 0 and shutil.which("pdftoppm") is None:
+        sys.exit("Scanned pages need poppler's pdftoppm on PATH; install it or pass --scanned-ratio 0")
+
+    workdir = tempfile.mkdtemp(prefix="iep-e2e-")
+    ports = {name: free_port() for name in ("openai", "payload", "api", "internal")}
+    configure_environment(args, ports, workdir)
+
+    import httpx
+    from celery.contrib.testing.worker import start_worker
+    from benchmarks.fakes import (
+        BackgroundServer, HashedEmbedding, HashedSparseEmbedding, SerializedClient, fake_openai_app, stub_payload_app,
+    )
+    from app import resources
+    from app.main import app as api_app
+    from app.tasks import celery_app, CPU_QUEUE, IO_QUEUE
+    import app.celery_config  # registers the pipeline tasks
+
+    if args.embeddings == "hashed":
+        resources._embedding_model = HashedEmbedding()
+        resources._sparse_model = HashedSparseEmbedding()
+
+    resources._qdrant_client = SerializedClient(resources.get_qdrant_client())
+    # The in-memory transport polls once a second by default, which would add a second to every stage
+    celery_app.conf.broker_transport_options = {**celery_app.conf.broker_transport_options, "polling_interval": 0.01}
+
+    timer = StageTimer()
+    timer.connect()
+    openai_app = fake_openai_app(latency=args.openai_latency, rate_limit_ratio=args.openai_429_ratio)
+    payload_app = stub_payload_app()
+
+    async def run() -> dict:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{ports['api']}", cookies={"payload-token": "benchmark"},
+                                     timeout=args.timeout) as client:
+            await wait_until_ready(client)
+            report = {"startup_rss_mb": peak_rss_mb()}
+            report["pipeline"] = await run_pipeline(client, args, payload_app, openai_app, timer)
+            job_ids = [row["job_id"] for row in report["pipeline"]]
+            report["load"] = await run_load(client, args, payload_app, job_ids)
+            report["model_calls"] = dict(openai_app.state.calls)
+            report["rate_limited"] = openai_app.state.rate_limited
+            return report
+
+    try:
+        with BackgroundServer(openai_app, ports["openai"]), BackgroundServer(payload_app, ports["payload"]), \
+                BackgroundServer(api_app, ports["api"]), \
+                start_worker(celery_app, pool="threads", concurrency=args.worker_concurrency, perform_ping_check=False,
+                             queues=[CPU_QUEUE, IO_QUEUE, "celery"], shutdown_timeout=30):
+            report = asyncio.run(run())
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+"""
+Local stand-ins for the services the pipeline talks to, for the end-to-end benchmark:
+
+- a mock OpenAI chat completions server that answers structured-output requests from their JSON schema,
+  with configurable latency and rate-limit (429) responses
+- a stub Payload CMS serving /users/me, /media and /jobs
+- hashed dense and sparse embedding models with the fastembed interface, for runs without model weights
+- a lock around Qdrant's local (in-memory) client
+"""
+from collections import Counter
+from fastapi import FastAPI, Request, Response
+from types import SimpleNamespace
+from typing import Iterable, Optional
+import asyncio, itertools, json, random, re, threading, time, zlib
+
+import numpy as np
+import uvicorn
+
+FILLER_WORDS = (
+    "the student will demonstrate improved reading comprehension fluency and written expression across settings "
+    "with accommodations and specialized academic instruction delivered weekly by the resource specialist"
+).split()
+
+def filler_text(seed: int, words: int = 180) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(FILLER_WORDS) for _ in range(words)).capitalize() + "."
+
+def fake_value(schema: dict, defs: dict, rng: random.Random):
+    """
+    Any value valid for a strict structured-output schema, with short lists and strings.
+    """
+    if "$ref" in schema:
+        return fake_value(defs[schema["$ref"].rsplit("/", 1)[-1]], defs, rng)
+    if "anyOf" in schema:
+        options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+        return fake_value(options[0], defs, rng) if options else None
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: fake_value(prop, defs, rng) for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [fake_value(schema.get("items", {}), defs, rng) for _ in range(rng.randint(1, 3))]
+    if kind == "integer":
+        return rng.randint(0, 100)
+    if kind == "number":
+        return round(rng.uniform(0, 100), 1)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    return filler_text(rng.randrange(1 << 30), words=rng.randint(4, 16))
+
+def message_parts(messages: list) -> tuple:
+    # Text of the user turns and the image URLs sent with them
+    texts, images = [], []
+    for message in messages:
+        if message.get("role") != "user":
+            continue
+        content = message.get("content")
+        if isinstance(content, str):
+            texts.append(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                texts.append(part["text"])
+            elif part.get("type") == "image_url":
+                images.append(part["image_url"]["url"])
+    return " ".join(texts), images
+
+def pick_section(section_types: list, text: str, key: str) -> str:
+    # Synthetic text pages name their section; images are assigned one by a stable hash
+    for section_type in section_types:
+        if section_type in text:
+            return section_type
+    return section_types[zlib.crc32(key.encode('utf-8')) % len(section_types)]
+
+def page_schema_content(name: str, schema: dict, text: str, images: list) -> Optional[dict]:
+    # The page classification schemas get answers consistent with the request; None for anything else
+    if name == "IEPPageSection":
+        return {"section_type": pick_section(schema["properties"]["section_type"]["enum"], text, text)}
+    if name == "IEPPage":
+        section_types = schema["properties"]["section_type"]["enum"]
+        return {"section_type": pick_section(section_types, "", images[0]), "full_text": filler_text(zlib.crc32(images[0].encode()))}
+    if name == "IEPPageBatch":
+        section_types = schema["$defs"]["IEPBatchPage"]["properties"]["section_type"]["enum"]
+        return {"pages": [
+            {"section_type": pick_section(section_types, "", image), "full_text": filler_text(zlib.crc32(image.encode())), "page_index": index}
+            for index, image in enumerate(images)
+        ]}
+    return None
+
+def fake_openai_app(latency: float = 0.3, rate_limit_ratio: float = 0.0, retry_after_ms: int = 200, seed: int = 0) -> FastAPI:
+    """
+    Answers /v1/chat/completions with schema-valid content after `latency` seconds (+/- 50%), and with
+    a 429 carrying retry-after-ms for `rate_limit_ratio` of requests. Call counts are kept on app.state.
+    """
+    app = FastAPI()
+    app.state.calls = Counter()
+    app.state.rate_limited = 0
+    app.state.tokens = 0
+    rng = random.Random(seed)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if rng.random() < rate_limit_ratio:
+            app.state.rate_limited += 1
+            return Response(
+                status_code=429, headers={"retry-after-ms": str(retry_after_ms)}, media_type="application/json",
+                content=json.dumps({"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}),
+            )
+        await asyncio.sleep(latency * rng.uniform(0.5, 1.5))
+
+        response_format = body["response_format"]["json_schema"]
+        name, schema = response_format["name"], response_format["schema"]
+        text, images = message_parts(body["messages"])
+        content = page_schema_content(name, schema, text, images)
+        if content is None:
+            content = fake_value(schema, schema.get("$defs", {}), random.Random(zlib.crc32(text.encode('utf-8'))))
+        app.state.calls[name] += 1
+
+        content_json = json.dumps(content)
+        prompt_tokens = len(json.dumps(body["messages"])) // 4 if not images else len(text) // 4 + 765 * len(images)
+        completion_tokens = len(content_json) // 4
+        app.state.tokens += prompt_tokens + completion_tokens
+        return {
+            "id": f"chatcmpl-bench-{sum(app.state.calls.values())}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content_json, "refusal": None},
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    return app
+
+def stub_payload_app(user_id: str = "bench-user", latency: float = 0.0) -> FastAPI:
+    """
+    The subset of the Payload REST API the backend uses. Jobs are kept in app.state.jobs.
+    """
+    app = FastAPI()
+    app.state.jobs = {}
+    app.state.requests = Counter()
+    ids = itertools.count(1)
+
+    @app.middleware("http")
+    async def count_requests(request: Request, call_next):
+        app.state.requests[f"{request.method} /{request.url.path.strip('/').split('/')[0]}"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        return await call_next(request)
+
+    @app.get("/users/me")
+    async def users_me(request: Request):
+        if not request.headers.get("authorization"):
+            return {"user": None}
+        return {"user": {"id": user_id, "email": f"{user_id}@example.com", "role": "user"}}
+
+    @app.post("/media", status_code=201)
+    async def upload_media(request: Request):
+        form = await request.form()
+        return {"doc": {"id": f"media-{next(ids)}", "filename": form["file"].filename}}
+
+    @app.post("/jobs", status_code=201)
+    async def create_job(request: Request):
+        job = {"id": f"job-{next(ids)}", **(await request.json()), "createdAt": time.time()}
+        app.state.jobs[job["id"]] = job
+        return {"doc": job}
+
+    @app.patch("/jobs/{job_id}")
+    async def patch_job(job_id: str, request: Request):
+        job = app.state.jobs.setdefault(job_id, {"id": job_id})
+        job.update(await request.json())
+        job["updatedAt"] = time.time()
+        return {"doc": job}
+
+    @app.get("/jobs")
+    async def list_jobs(request: Request):
+        # Filtering, newest-first pagination and the Jobs collection's ?omit= projection; docs are never populated
+        params = request.query_params
+        owner = params.get("where[user][equals]")
+        page, limit = int(params.get("page", 1)), int(params.get("limit", 10))
+        omit = params["omit"].split(",") if params.get("omit") else []
+        docs = [job for job in reversed(list(app.state.jobs.values())) if owner is None or job.get("user") == owner]
+        total_pages = max(1, -(-len(docs) // limit))
+        page_docs = []
+        for job in docs[(page - 1) * limit:page * limit]:
+            if "resultData" in omit:
+                job = {**job, "hasResults": bool((job.get("resultData") or {}).get("Result"))}
+            page_docs.append({key: value for key, value in job.items() if key not in omit})
+        return {"docs": page_docs, "totalDocs": len(docs), "limit": limit, "page": page, "totalPages": total_pages,
+                "hasPrevPage": page > 1, "hasNextPage": page < total_pages}
+
+    @app.get("/jobs/{job_id}")
+    async def get_job(job_id: str):
+        if job_id not in app.state.jobs:
+            return Response(status_code=404)
+        return app.state.jobs[job_id]
+
+    return app
+
+def hashed_vector(text: str, size: int) -> np.ndarray:
+    vector = np.zeros(size, dtype=np.float32)
+    for term in re.findall(r"[a-z0-9]+", text.lower()):
+        digest = zlib.crc32(term.encode('utf-8'))
+        vector[digest % size] += 1.0 if digest & 0x10000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class HashedEmbedding:
+    """
+    Dense embedding model with the fastembed interface, hashing terms into a fixed-size unit vector.
+    Needs no weights and almost no CPU, so a run measures the pipeline rather than ONNX.
+    """
+    def __init__(self, size: int = 384):
+        self.size = size
+
+    def embed(self, documents: Iterable[str], batch_size: int = 256, **kwargs):
+        for document in documents:
+            yield hashed_vector(document, self.size)
+
+    def query_embed(self, query, **kwargs):
+        yield from self.embed([query] if isinstance(query, str) else query)
+
+class HashedSparseEmbedding:
+    """
+    BM25-like sparse model with the fastembed interface: term-frequency weights on hashed term indices.
+    """
+    def embed(self, documents: Iterable[str], batch_size: int = 256, **kwargs):
+        for document in documents:
+            counts = Counter(zlib.crc32(term.encode('utf-8')) for term in re.findall(r"[a-z0-9]+", document.lower()))
+            indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+            values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            yield SimpleNamespace(indices=indices, values=values)
+
+    def query_embed(self, query, **kwargs):
+        yield from self.embed([query] if isinstance(query, str) else query)
+
+class SerializedClient:
+    """
+    Proxy that runs every method of the wrapped client under one lock. Qdrant's local mode is not
+    thread-safe, and the threaded worker and the API's thread pool call it concurrently.
+    """
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._client, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            with self._lock:
+                return attribute(*args, **kwargs)
+        return call
+
+class BackgroundServer:
+    """
+    Runs an ASGI app with uvicorn on a daemon thread, for use as a context manager.
+    """
+    def __init__(self, app, port: int):
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("Server failed to start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
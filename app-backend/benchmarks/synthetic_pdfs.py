@@ -0,0 +1,101 @@
+"""
+Synthetic multi-page IEP PDFs for the end-to-end benchmark, written without a PDF library.
+
+Text pages carry a real text layer (taken by PyPDF2 without rendering); scanned pages are a full-page
+JPEG with no text, so they go through poppler and the vision model. Every page is different, so
+none are dropped as duplicates.
+"""
+from io import BytesIO
+from PIL import Image, ImageDraw
+from typing import List
+import random, textwrap
+
+from benchmarks.chunking_benchmark import synthetic_section
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+IEP_SECTION_TYPES = [
+    "IEPInformationAndEligibility", "CurrentAcademicAndFunctionalLevels", "AnnualGoalsAndObjectives",
+    "FAPEServiceOffer", "EducationalSettingOffer", "EmergencyInstructionalProgram", "AssessmentPlan",
+]
+
+def escape_pdf_text(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def page_lines(rng: random.Random, section_type: str, page_number: int) -> List[str]:
+    # The section name on the first line lets the mock model classify text pages consistently
+    body = synthetic_section(rng, 1, chars_per_page=2400)[0]
+    return [f"Section: {section_type} - page {page_number}"] + textwrap.wrap(" ".join(body.split()), 95)[:60]
+
+def text_page_stream(lines: List[str]) -> bytes:
+    commands = ["BT", "/F1 9 Tf", "11 TL", "40 752 Td"]
+    for line in lines:
+        commands.append(f"({escape_pdf_text(line)}) Tj T*")
+    commands.append("ET")
+    return "\n".join(commands).encode('latin-1', 'replace')
+
+def scanned_page_image(lines: List[str], dpi: int = 100) -> bytes:
+    width, height = PAGE_WIDTH * dpi // 72, PAGE_HEIGHT * dpi // 72
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    for row, line in enumerate(lines):
+        draw.text((50, 50 + row * 15), line, fill=0)
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=75)
+    return buffer.getvalue()
+
+def build_pdf(pages: List[dict]) -> bytes:
+    """
+    Assemble a PDF from pages given as {"stream": bytes} or {"stream": bytes, "image": (jpeg, width, height)}.
+    """
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in pages:
+        resources = "/Font << /F1 3 0 R >>"
+        if "image" in page:
+            jpeg, width, height = page["image"]
+            objects.append(
+                f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} /ColorSpace /DeviceGray "
+                f"/BitsPerComponent 8 /Filter /DCTDecode /Length {len(jpeg)} >>\nstream\n".encode() + jpeg + b"\nendstream"
+            )
+            resources += f" /XObject << /Im1 {len(objects)} 0 R >>"
+        objects.append(f"<< /Length {len(page['stream'])} >>\nstream\n".encode() + page["stream"] + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << {resources} >> /Contents {content_id} 0 R >>".encode()
+        )
+        page_ids.append(len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{page_id} 0 R' for page_id in page_ids)}] /Count {len(page_ids)} >>".encode()
+
+    output = BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = []
+    for object_id, body in enumerate(objects, start=1):
+        offsets.append(output.tell())
+        output.write(f"{object_id} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref_offset = output.tell()
+    output.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        output.write(f"{offset:010d} 00000 n \n".encode())
+    output.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+    return output.getvalue()
+
+def synthetic_iep_pdf(pages: int, scanned_ratio: float = 0.0, seed: int = 0) -> bytes:
+    """
+    A PDF of `pages` pages spread over the IEP sections in order, with about `scanned_ratio` of them scanned.
+    """
+    rng = random.Random(seed)
+    pdf_pages = []
+    for index in range(pages):
+        section_type = IEP_SECTION_TYPES[index * len(IEP_SECTION_TYPES) // pages]
+        lines = page_lines(rng, section_type, index + 1)
+        if rng.random() < scanned_ratio:
+            jpeg = scanned_page_image(lines)
+            with Image.open(BytesIO(jpeg)) as image:
+                width, height = image.size
+            stream = f"q {PAGE_WIDTH} 0 0 {PAGE_HEIGHT} 0 0 cm /Im1 Do Q".encode()
+            pdf_pages.append({"stream": stream, "image": (jpeg, width, height)})
+        else:
+            pdf_pages.append({"stream": text_page_stream(lines)})
+    return build_pdf(pdf_pages)
@@ -2,33 +2,84 @@
 import { useState, useEffect } from "react";
 import PortalMenu from "@/components/PortalMenu";
 import FileUploadModal from "@/components/upload/FileUploadModal";
-import { getAllJobs } from "@/lib/JobProcessing";
+import { getAllJobs, getJobResult } from "@/lib/JobProcessing";
 import useJobStore from "@/store/jobStore";
 import { useRouter } from "next/navigation";
 
+const POLL_INTERVAL_MS = 5000;
+
+// Human readable status for a job, including partial progress while it is still running
+function describeProgress(job) {
+  const progress = job.progress;
+  if (job.status === "completed") return "Completed";
+  if (job.status === "terminatedWithError") return "Failed";
+  if (!progress) return "Queued";
+  switch (progress.stage) {
+    case "rasterizing":
+      return `Scanning pages (${progress.pages_rasterized}/${progress.pages_total ?? "?"})`;
+    case "extracting":
+      return `Reading pages (${progress.pages_classified + (progress.pages_skipped ?? 0)}/${progress.pages_total ?? "?"})`;
+    case "structuring":
+      return `Summarizing sections (${progress.sections_structured}/${progress.sections_total})`;
+    case "indexing":
+      return "Preparing chatbot";
+    default:
+      return "Queued";
+  }
+}
+
+function hasResults(job) {
+  return job.hasResults ?? Object.keys(job.resultData?.Result ?? {}).length > 0;
+}
+
+// The CMS backfills file names onto older jobs; one whose upload was deleted has none to show
+const UNNAMED_FILE_LABEL = "Untitled document";
+
+function fileName(job) {
+  const file = job.files?.[0];
+  return file?.filename ?? file?.file?.filename ?? UNNAMED_FILE_LABEL;
+}
+
 export default function JobsPage() {
   const router = useRouter();
   const [jobs, setJobs] = useState([]);
+  const [page, setPage] = useState(1);
+  const [pagination, setPagination] = useState({});
   const { setJobId, setResultData } = useJobStore(); // Destructure actions from job store
 
   // Fetch jobs from API
   const fetchJobs = async () => {
     try {
-      const jobsData = await getAllJobs();
-      setJobs(jobsData);
+      const { docs, ...pageInfo } = await getAllJobs(page);
+      setJobs(docs);
+      setPagination(pageInfo);
     } catch (error) {
       console.error("Failed to fetch jobs:", error);
     }
   };
 
   useEffect(() => {
-    fetchJobs(); // Initial load of jobs
-  }, []);
+    fetchJobs(); // Load the current page of jobs
+  }, [page]);
+
+  // Keep polling while any job is still running so partial summaries show up as sections finish
+  const hasRunningJobs = jobs.some((job) => job.status === "started");
+  useEffect(() => {
+    if (!hasRunningJobs) return;
+    const interval = setInterval(fetchJobs, POLL_INTERVAL_MS);
+    return () => clearInterval(interval);
+  }, [hasRunningJobs, page]);
 
-  const handleChooseJob = (job) => {
-    setJobId(job.id);
-    setResultData(job.resultData);
-    router.push("/portal/summary");
+  // The listing leaves results out, so they are fetched for the chosen job only
+  const handleChooseJob = async (job) => {
+    try {
+      const { resultData } = await getJobResult(job.id);
+      setJobId(job.id);
+      setResultData(resultData);
+      router.push("/portal/summary");
+    } catch (error) {
+      console.error("Failed to fetch job result:", error);
+    }
   };
 
   return (
@@ -71,28 +122,44 @@ export default function JobsPage() {
               <th>Date Created</th>
               <th>Last Updated</th>
               <th>File Name</th>
+              <th>Status</th>
               <th>Actions</th>
             </tr>
           </thead>
           <tbody>
             {jobs.map((job, index) => (
               <tr key={job.id}>
-                <th>{index + 1}</th>
+                <th>{((pagination.page ?? 1) - 1) * (pagination.limit ?? 0) + index + 1}</th>
                 <td>{new Date(job.createdAt).toLocaleDateString()}</td>
                 <td>{new Date(job.updatedAt).toLocaleDateString()}</td>
-                <td>{job.files[0]?.file.filename}</td>
+                <td>{fileName(job)}</td>
+                <td>{describeProgress(job)}</td>
                 <td>
                   <button
                     className="btn btn-secondary"
                     onClick={() => handleChooseJob(job)}
+                    disabled={!hasResults(job)}
                   >
-                    Choose
+                    {job.status === "started" && hasResults(job) ? "View partial" : "Choose"}
                   </button>
                 </td>
               </tr>
             ))}
           </tbody>
         </table>
+        {pagination.totalPages > 1 && (
+          <div className="flex items-center gap-4 mt-4">
+            <button className="btn btn-sm" onClick={() => setPage(page - 1)} disabled={!pagination.hasPrevPage}>
+              Previous
+            </button>
+            <span>
+              Page {pagination.page} of {pagination.totalPages}
+            </span>
+            <button className="btn btn-sm" onClick={() => setPage(page + 1)} disabled={!pagination.hasNextPage}>
+              Next
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
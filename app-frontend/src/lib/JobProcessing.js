@@ -31,9 +31,11 @@ export const upload = async (formData) => {
   }
 };
 
-export const getAllJobs = async () => {
+// One page of jobs without their results: { docs, page, totalPages, hasNextPage, hasPrevPage, ... }
+export const getAllJobs = async (page = 1) => {
   try {
     const response = await axios.get(`${backendBaseRoute}/get-all`, {
+      params: { page },
       withCredentials: true,
     });
     return response.data;
@@ -42,3 +44,16 @@ export const getAllJobs = async () => {
     throw error;
   }
 };
+
+// A single job's status, progress and resultData
+export const getJobResult = async (jobId) => {
+  try {
+    const response = await axios.get(`${backendBaseRoute}/${jobId}/result`, {
+      withCredentials: true,
+    });
+    return response.data;
+  } catch (error) {
+    console.error('Error retrieving job result:', error);
+    throw error;
+  }
+};